@@ -11,12 +11,12 @@ def main():
     print("-------------------------")
 
     bus = find_pca_bus()
-    if not bus:
+    if bus is None:
         print("找不到 PCA9685")
         sys.exit(1)
         
-    pca = PCA9685(bus)
-    pca.set_frequency(200)
+    pca = PCA9685(bus, warm_start=True)
+    pca.set_frequency(200, skip_if_set=True)
     motors = MotorDriver(pca)
 
     try:
@@ -1,3 +1,5 @@
+import select
+import sys
 import time
 from smbus2 import SMBus
 
@@ -72,6 +74,111 @@ def set_frequency(bus, freq_hz):
     time.sleep(0.005)
     write8(bus, MODE1, old | 0x80)  # restart
 
+# ====== 校正（python3 motor_test_l298n.py calibrate [輸出檔]）======
+# bus 與輸出檔沿用 src/config.py 的 I2C_BUS（None = find_pca_bus 自動偵測）/ MOTOR_LUT_FILE
+CALIB_DUTIES = (0.3, 0.45, 0.6, 0.8, 1.0)  # 量測轉速的 duty（起步點之外）
+CALIB_SECONDS = 5.0                      # 每個 duty 轉幾秒（讓你數圈數）
+RAMP_STEP = 0.01                         # 找起步 duty 時每次增加多少
+RAMP_INTERVAL = 0.3                      # 每一步停留秒數
+
+WHEEL_PINS = {"left": (ENA, IN1, IN2), "right": (ENB, IN3, IN4)}
+
+
+def _enter_pressed(timeout):
+    """等待 timeout 秒，期間有按 Enter 回傳 True"""
+    ready, _, _ = select.select([sys.stdin], [], [], timeout)
+    if ready:
+        sys.stdin.readline()
+        return True
+    return False
+
+
+def _find_start_duty(bus, pins, sign):
+    """從 0 慢慢加 duty，輪子一開始轉就按 Enter → 回傳起步 duty"""
+    en, a, b = pins
+    u = RAMP_STEP
+    print("  duty 逐步增加中，輪子開始轉動時按 Enter ...")
+    try:
+        while u < 1.0:
+            set_wheel(bus, sign * u, en, a, b)
+            print(f"\r  duty = {u:.2f}", end="", flush=True)
+            if _enter_pressed(RAMP_INTERVAL):
+                print()
+                return u
+            u += RAMP_STEP
+    finally:
+        set_wheel(bus, 0.0, en, a, b)
+    print()
+    return 1.0
+
+
+def _measure_rps(bus, pins, sign, u):
+    """以 duty u 轉 CALIB_SECONDS 秒，請使用者輸入看到的圈數 → 轉速（圈/秒）"""
+    en, a, b = pins
+    input(f"  duty {u:.2f}：按 Enter 開始轉 {CALIB_SECONDS:.0f} 秒（看輪子上的記號數圈數）")
+    set_wheel(bus, sign * u, en, a, b)
+    time.sleep(CALIB_SECONDS)
+    set_wheel(bus, 0.0, en, a, b)
+
+    while True:
+        try:
+            turns = float(input("  轉了幾圈？ "))
+            return turns / CALIB_SECONDS
+        except ValueError:
+            print("  請輸入數字（可含小數）")
+
+
+def calibrate(out_path=None):
+    """
+    量測每一輪、每個方向的反應，產生「速度 → PCA 計數」查表（MotorDriver 會自動載入）
+    - 請把車子架高（輪子離地），並在每個輪子上做一個記號
+    - 每條曲線：先找起步 duty，再量 CALIB_DUTIES 各點的轉速
+    :param out_path: 輸出檔；None 則寫到 config.MOTOR_LUT_FILE
+    """
+    # 從 repo 根目錄執行時可直接匯入 src（只用到建表 / bus 偵測，不會載入 cv2）
+    from src import config
+    from src.motor_calibration import save_calibration
+    from src.pca9685_smbus import find_pca_bus
+
+    if out_path is None:
+        out_path = config.MOTOR_LUT_FILE
+
+    bus_num = config.I2C_BUS if config.I2C_BUS is not None else find_pca_bus(ADDR)
+    if bus_num is None:
+        print("PCA9685 not found. Set I2C_BUS in src/config.py.")
+        return
+
+    points = {}
+    with SMBus(bus_num) as bus:
+        write8(bus, MODE1, 0x00)
+        time.sleep(0.01)
+        set_frequency(bus, 200)
+        stop_all(bus)
+
+        try:
+            for wheel, pins in WHEEL_PINS.items():
+                points[wheel] = {}
+                for direction, sign in (("fwd", 1.0), ("rev", -1.0)):
+                    print(f"\n[{wheel} / {direction}]")
+                    start = _find_start_duty(bus, pins, sign)
+                    curve = [[start, 0.0]]
+                    for u in CALIB_DUTIES:
+                        if u > start:
+                            curve.append([u, _measure_rps(bus, pins, sign, u)])
+                    points[wheel][direction] = curve
+                    print(f"  -> {curve}")
+        finally:
+            stop_all(bus)
+
+    data = save_calibration(out_path, points, pca_freq=200)
+    print(f"\nSaved {out_path}")
+    for wheel in WHEEL_PINS:
+        for direction in ("fwd", "rev"):
+            table = data["lut"][wheel][direction]
+            print(f"  {wheel:5s} {direction}: speed 0.3 -> {table[300][1]} counts, "
+                  f"0.8 -> {table[800][1]} counts")
+
+
 def main():
     with SMBus(BUS) as bus:
         # 基本初始化
@@ -116,4 +223,7 @@ def main():
         set_motor(bus, 0.0, 0.0)
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == "calibrate":
+        calibrate(*sys.argv[2:3])
+    else:
+        main()
@@ -0,0 +1,315 @@
+# src/autotune.py
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .runtime_config import RuntimeConfig
+from .simulator import Simulator, Track
+
+CACHE_PATH = os.path.expanduser("~/.cache/line_follower/autotune.json")
+
+# 可調參數：(下限, 上限, 格點搜尋的取值)
+SEARCH_SPACE = {
+    "KP": (0.05, 1.0, (0.15, 0.25, 0.4)),
+    "KD": (0.0, 4.0, (1.0, 2.0)),
+    "STEER_LIMIT": (0.2, 1.0, (0.5, 0.8)),
+    "SLEW_RATE": (2.0, 30.0, (9.0,)),
+    "BASE_SPEED": (0.15, 1.0, (0.3, 0.5, 0.7)),
+}
+
+# 沒跑完指定圈數時的分數（一定比任何跑完的結果差；跑越遠分數越低）
+FAIL_SCORE = 1000.0
+
+# 調參時固定的設定：關閉速度排程，BASE_SPEED / KP / KD 才會生效
+TUNE_OVERRIDES = {"SPEED_SCHEDULE": False}
+
+# 只在模擬時固定（不寫進輸出檔）：模擬器有自己的馬達模型，不讀車上的校正檔，
+# 否則結果會隨 calib/ 的內容改變，而快取 key 裡只有檔名
+SIM_OVERRIDES = {"MOTOR_LUT_FILE": ""}
+
+
+def code_salt() -> str:
+    """
+    src/ 底下所有 .py 的 hash：模擬器 / 控制 / 視覺的程式改了，舊的快取結果就不再沿用
+    """
+    h = hashlib.sha1()
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(src_dir)):
+        if name.endswith(".py"):
+            h.update(name.encode("utf-8"))
+            with open(os.path.join(src_dir, name), "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+
+CODE_SALT = code_salt()
+
+
+def param_key(params: dict, options: dict) -> str:
+    """參數 + 模擬設定（含完整的基礎設定）+ 程式版本 → 快取 key（同一組設定不重跑）"""
+    blob = json.dumps({"params": params, "options": options, "code": CODE_SALT}, sort_keys=True)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def score(result: dict, track_length: float, laps: int, cte_weight: float) -> float:
+    """
+    分數越低越好
+    - 跑完：總圈速（秒）+ cte_weight * 橫向誤差 RMS（公分）
+    - 出界 / 逾時：FAIL_SCORE 減去完成比例，讓搜尋仍知道哪個方向比較好
+    """
+    if result["laps"] < laps:
+        done = min(1.0, max(0.0, result["progress"] / (track_length * laps)))
+        return FAIL_SCORE * (2.0 - done)
+    return sum(result["lap_times"]) + cte_weight * result["cte_rms"] * 100
+
+
+def _evaluate(args):
+    """
+    子行程中跑一次模擬（頂層函式，ProcessPoolExecutor 才能 pickle）
+    :param args: (params, options)
+    :return: {"score", "result"}
+    """
+    params, options = args
+    overrides = dict(options["base"])
+    overrides.update(params)
+
+    # 模擬器 / PCA9685 / 掉線恢復的 print 不要洗版
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim = Simulator(
+            RuntimeConfig(overrides),
+            track=Track.oval(options["straight"], options["radius"]),
+            sensor=options["sensor"],
+        )
+        result = sim.run(laps=options["laps"], max_time=options["max_time"])
+
+    return {
+        "score": score(result, sim.track.length, options["laps"], options["cte_weight"]),
+        "result": {k: result[k] for k in ("laps", "lap_times", "off_track", "cte_rms", "cte_max")},
+    }
+
+
+class AutoTuner:
+    """
+    在模擬器上自動找 PD / 速度參數
+    - 候選參數在 ProcessPoolExecutor 裡平行評估（每個候選跑一次閉迴路模擬）
+    - 搜尋：先粗格點（SEARCH_SPACE 的取值），再從最佳點做座標下降
+      （每輪同時試每個參數的 ±step，有進步就移動，否則 step 減半）
+    - 結果依 param_key 存進 JSON 快取，重跑 / 中斷後繼續不會重算
+    """
+
+    def __init__(self, options: dict, names=None, workers: int = None, cache_path: str = CACHE_PATH):
+        self.options = options
+        self.names = list(names) if names else list(SEARCH_SPACE)
+        self.workers = workers
+        self.cache_path = cache_path
+        self.cache = self._load_cache()
+
+        self.evaluated = 0
+        self.cache_hits = 0
+        self.best = None   # (score, params)
+
+    # ===== 快取 =====
+    def _load_cache(self) -> dict:
+        if not self.cache_path:
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self) -> None:
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            tmp = self.cache_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.cache, f)
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            print(f"[Tune] Could not write cache {self.cache_path}: {e}")
+
+    # ===== 評估 =====
+    def _clip(self, params: dict) -> dict:
+        """限制在 SEARCH_SPACE 範圍內並取 4 位小數（快取 key 才穩定）"""
+        out = {}
+        for name, value in params.items():
+            lo, hi, _ = SEARCH_SPACE[name]
+            out[name] = round(min(hi, max(lo, value)), 4)
+        return out
+
+    def evaluate(self, candidates, executor) -> list:
+        """
+        :param candidates: 參數 dict 的 list
+        :return: 每個候選的分數（與輸入同順序）
+        """
+        candidates = [self._clip(p) for p in candidates]
+        keys = [param_key(p, self.options) for p in candidates]
+
+        todo = {}
+        for key, params in zip(keys, candidates):
+            if key in self.cache:
+                self.cache_hits += 1
+            else:
+                todo.setdefault(key, params)
+
+        if todo:
+            jobs = [(params, self.options) for params in todo.values()]
+            for key, out in zip(todo, executor.map(_evaluate, jobs)):
+                self.cache[key] = {"params": todo[key], **out}
+            self.evaluated += len(todo)
+            self._save_cache()
+
+        scores = [self.cache[key]["score"] for key in keys]
+        for s, params in zip(scores, candidates):
+            if self.best is None or s < self.best[0]:
+                self.best = (s, params)
+        return scores
+
+    # ===== 搜尋 =====
+    def grid(self, start: dict, executor) -> None:
+        """粗格點：所有 SEARCH_SPACE 取值的組合（未調的參數固定為 start）"""
+        candidates = [dict(start)]
+        for name in self.names:
+            candidates = [
+                {**params, name: value}
+                for params in candidates
+                for value in SEARCH_SPACE[name][2]
+            ]
+
+        self.evaluate(candidates, executor)
+        print(f"[Tune] Grid: {len(candidates)} candidates, best {self.best[0]:.3f} {self.best[1]}")
+
+    def descend(self, executor, step_ratio: float = 0.1, min_ratio: float = 0.01,
+                max_rounds: int = 40) -> None:
+        """從目前最佳點做座標下降"""
+        steps = {n: (SEARCH_SPACE[n][1] - SEARCH_SPACE[n][0]) * step_ratio for n in self.names}
+
+        for rnd in range(1, max_rounds + 1):
+            current_score, current = self.best
+
+            candidates = []
+            for name in self.names:
+                for sign in (1, -1):
+                    candidates.append({**current, name: current[name] + sign * steps[name]})
+            self.evaluate(candidates, executor)
+
+            if self.best[0] < current_score:
+                print(f"[Tune] Round {rnd}: {self.best[0]:.3f} {self.best[1]}")
+                continue
+
+            # 這一輪沒有進步：縮小步長
+            steps = {n: s * 0.5 for n, s in steps.items()}
+            if all(
+                steps[n] < (SEARCH_SPACE[n][1] - SEARCH_SPACE[n][0]) * min_ratio
+                for n in self.names
+            ):
+                break
+
+    def run(self, start: dict) -> tuple:
+        """
+        :param start: 起點（未調的參數也從這裡取值）
+        :return: (best_score, best_params)
+        """
+        start = self._clip({n: start[n] for n in SEARCH_SPACE})
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            self.evaluate([start], executor)
+            print(f"[Tune] Start: {self.best[0]:.3f} {start}")
+            self.grid(start, executor)
+            self.descend(executor)
+        return self.best
+
+
+def write_overrides(path: str, params: dict) -> None:
+    """
+    把最佳參數寫成 RuntimeConfig 可讀的 JSON（若檔案已存在則合併，保留其他 key）
+    寫到 CONFIG_FILE（tuning.json）時，執行中的車會直接熱更新
+    """
+    data = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+        if isinstance(existing, dict):
+            data = existing
+    except (OSError, ValueError):
+        pass
+
+    data.update(params)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _run_autotune():
+    """
+    測試指令：python3 -m src.autotune --laps 2 --workers 4 --out tuning.json
+    """
+    parser = argparse.ArgumentParser(description="Tune PD / speed parameters in the simulator")
+    parser.add_argument("--laps", type=int, default=2)
+    parser.add_argument("--straight", type=float, default=1.5, help="straight length (m)")
+    parser.add_argument("--radius", type=float, default=0.5, help="curve radius (m)")
+    parser.add_argument("--max-time", type=float, default=120.0, help="simulated seconds per run")
+    parser.add_argument("--sensor", choices=Simulator.SENSORS, default="model",
+                        help="'camera' renders and runs Vision (slower, exact)")
+    parser.add_argument("--cte-weight", type=float, default=1.0,
+                        help="seconds of lap time per cm of RMS cross-track error")
+    parser.add_argument("--params", default=",".join(SEARCH_SPACE),
+                        help="comma-separated parameters to tune")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache", default=CACHE_PATH, help="result cache ('' to disable)")
+    parser.add_argument("--out", default="autotune_best.json",
+                        help="JSON overrides file to write (merged if it exists)")
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.params.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SEARCH_SPACE]
+    if unknown:
+        parser.error(f"unknown parameters: {unknown} (choose from {list(SEARCH_SPACE)})")
+
+    # 起點：config.py + 目前的 tuning.json；BASE_SPEED / KP / KD 只在關閉速度排程時生效
+    cfg = RuntimeConfig()
+    if os.path.exists(cfg.CONFIG_FILE):
+        cfg.load_file(cfg.CONFIG_FILE)
+        cfg.apply_pending()
+
+    # 基礎設定：未調參數的完整快照（含 tuning.json），子行程照這份跑，也一起算進快取 key
+    base = {k: v for k, v in cfg.as_dict().items() if k not in SEARCH_SPACE}
+    base.update(TUNE_OVERRIDES)
+    base.update(SIM_OVERRIDES)
+
+    options = {
+        "base": base,
+        "laps": args.laps,
+        "straight": args.straight,
+        "radius": args.radius,
+        "max_time": args.max_time,
+        "sensor": args.sensor,
+        "cte_weight": args.cte_weight,
+    }
+
+    tuner = AutoTuner(options, names, args.workers, args.cache or None)
+    best_score, best = tuner.run({n: getattr(cfg, n) for n in SEARCH_SPACE})
+
+    print(f"[Tune] Evaluated {tuner.evaluated} runs ({tuner.cache_hits} cache hits)")
+    if best_score >= FAIL_SCORE:
+        print("[Tune] No candidate finished the track; not writing overrides")
+        return
+
+    result = tuner.cache[param_key(best, options)]["result"]
+    print(f"[Tune] Best score {best_score:.3f}: {best}")
+    print(f"[Tune] Laps {[round(t, 2) for t in result['lap_times']]} | "
+          f"CTE rms {result['cte_rms'] * 100:.1f} cm, max {result['cte_max'] * 100:.1f} cm")
+
+    write_overrides(args.out, {**TUNE_OVERRIDES, **best})
+    print(f"[Tune] Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    _run_autotune()
@@ -0,0 +1,156 @@
+# src/birdseye.py
+import json
+
+import cv2
+import numpy as np
+
+
+class GroundPlane:
+    """
+    影像 ↔ 地面（鳥瞰）轉換
+    - 由校正檔的 4 組以上對應點算 homography（影像像素 → 地面公尺，x 向前、y 向左），只算一次
+    - to_ground / lateral_error：只轉換少數線上的點（每 tick 幾十次乘法，最便宜）
+    - warp：整個 ROI 做 cv2.remap；remap 表依 (影像尺寸, ROI, 寬度) 快取，之後每張只剩 remap 本身
+
+    校正檔格式（JSON）：
+      {
+        "image_size": [640, 480],                      # 校正時的影像尺寸（實際尺寸不同會自動縮放）
+        "image_points": [[u, v], ...],                 # 地面上已知點在影像中的像素座標
+        "ground_points": [[x, y], ...],                # 對應的地面座標（公尺；x 向前、y 向左）
+        "ground_range": [near, far]                    # 選填：remap 的前後範圍，預設取 ground_points 的 x
+      }
+    """
+
+    def __init__(self, H, image_size, near: float, far: float):
+        """
+        :param H: 影像（校正尺寸）→ 地面 的 3x3 homography
+        :param image_size: 校正時的 (寬, 高)
+        :param near, far: remap 的前後範圍（公尺）
+        """
+        self.H = np.asarray(H, dtype=np.float64)
+        self.image_size = (int(image_size[0]), int(image_size[1]))
+        self.near = float(near)
+        self.far = float(far)
+
+        # 依實際影像尺寸縮放後的 H，與 remap 表的快取
+        self._scaled = {}
+        self._maps = {}
+
+    @classmethod
+    def from_points(cls, image_points, ground_points, image_size, ground_range=None):
+        src = np.asarray(image_points, dtype=np.float32)
+        dst = np.asarray(ground_points, dtype=np.float32)
+        if len(src) != len(dst) or len(src) < 4:
+            raise ValueError("need at least 4 matching image / ground points")
+
+        if len(src) == 4:
+            H = cv2.getPerspectiveTransform(src, dst)
+        else:
+            H, _ = cv2.findHomography(src, dst)
+            if H is None:
+                raise ValueError("points are degenerate (no homography)")
+
+        if ground_range is None:
+            ground_range = (float(dst[:, 0].min()), float(dst[:, 0].max()))
+        return cls(H, image_size, *ground_range)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        讀取校正檔
+        :return: GroundPlane；檔案不存在或格式不對時回傳 None
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return cls.from_points(
+                data["image_points"],
+                data["ground_points"],
+                data["image_size"],
+                data.get("ground_range"),
+            )
+        except FileNotFoundError:
+            print(f"[Vision] Bird's-eye calibration {path} not found")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"[Vision] Ignoring bird's-eye calibration {path}: {e}")
+        return None
+
+    def save(self, path: str, image_points, ground_points) -> None:
+        data = {
+            "image_size": list(self.image_size),
+            "image_points": [list(map(float, p)) for p in image_points],
+            "ground_points": [list(map(float, p)) for p in ground_points],
+            "ground_range": [self.near, self.far],
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+    # ===== 點轉換 =====
+    def homography(self, w: int, h: int):
+        """實際影像尺寸 (w, h) 的 影像 → 地面 homography（尺寸與校正不同時先縮放回校正尺寸）"""
+        H = self._scaled.get((w, h))
+        if H is None:
+            cw, ch = self.image_size
+            S = np.diag((cw / w, ch / h, 1.0))
+            H = self.H @ S
+            self._scaled[(w, h)] = H
+        return H
+
+    def to_ground(self, points, w: int, h: int):
+        """
+        :param points: N x 2 影像像素座標（整張影像，不是 ROI）
+        :return: N x 2 地面座標（公尺）
+        """
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+        return cv2.perspectiveTransform(pts, self.homography(w, h)).reshape(-1, 2)
+
+    def lateral_error(self, points, w: int, h: int, half_width: float) -> float:
+        """
+        線上點的平均橫向偏移 → error（與像素版相同的號誌：線在右邊為正）
+        :param half_width: 多少公尺的偏移對應 error = ±1
+        """
+        ground = self.to_ground(points, w, h)
+        offset = -float(ground[:, 1].mean())
+        return max(-1.0, min(1.0, offset / half_width))
+
+    # ===== 整個 ROI 轉成鳥瞰 =====
+    def output_size(self, w: int, half_width: float):
+        """鳥瞰圖尺寸：寬度沿用影像寬度（±half_width），高度依前後範圍等比例"""
+        out_h = max(1, int(round(w * (self.far - self.near) / (2.0 * half_width))))
+        return w, out_h
+
+    def maps(self, w: int, h: int, y_start: int, y_end: int, half_width: float):
+        """
+        remap 表（快取）：鳥瞰圖每個像素 → ROI 中的來源像素
+        鳥瞰圖 x：左緣 y = +half_width、右緣 y = -half_width；上緣 far、下緣 near
+        """
+        key = (w, h, y_start, y_end, half_width)
+        maps = self._maps.get(key)
+        if maps is not None:
+            return maps
+
+        out_w, out_h = self.output_size(w, half_width)
+        u = (np.arange(out_w) + 0.5) / out_w
+        v = (np.arange(out_h) + 0.5) / out_h
+        gy = half_width - u * 2.0 * half_width
+        gx = self.far - v * (self.far - self.near)
+        GX, GY = np.meshgrid(gx, gy, indexing="ij")
+
+        ground = np.stack((GX, GY), axis=-1).reshape(-1, 1, 2)
+        H_inv = np.linalg.inv(self.homography(w, h))
+        src = cv2.perspectiveTransform(ground, H_inv).reshape(out_h, out_w, 2)
+
+        map_x = src[..., 0].astype(np.float32)
+        map_y = (src[..., 1] - y_start).astype(np.float32)
+
+        # 定點數格式的表，remap 比浮點表快
+        maps = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+        self._maps[key] = maps
+        return maps
+
+    def warp(self, roi, w: int, h: int, y_start: int, y_end: int, half_width: float,
+             border=(255, 255, 255)):
+        """ROI → 鳥瞰圖（ROI 以外的地方填 border，應與背景同色）"""
+        map1, map2 = self.maps(w, h, y_start, y_end, half_width)
+        return cv2.remap(roi, map1, map2, cv2.INTER_LINEAR,
+                         borderMode=cv2.BORDER_CONSTANT, borderValue=border)
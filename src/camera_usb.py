@@ -1,27 +1,195 @@
 # src/camera_usb.py
+import re
+import statistics
+import subprocess
+import time
+from collections import namedtuple
+
 import cv2
-from .config import *
+from .runtime_config import CONFIG
+
+# 一個 V4L2 擷取模式（fps 為該尺寸支援的其中一個 frame rate）
+CameraMode = namedtuple("CameraMode", "fourcc width height fps")
+
+# 同樣 FPS / 尺寸時的格式偏好：YUYV 不需 CPU 解碼、也沒有 JPEG 壓縮延遲；
+# 頻寬不夠（YUYV 給不到目標 FPS）時才用 MJPG
+FOURCC_PREFERENCE = ("YUYV", "MJPG")
+
+
+def fourcc_to_str(code) -> str:
+    """CAP_PROP_FOURCC 的數值 → 'MJPG' 這類字串"""
+    code = int(code)
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ")
+
+
+def parse_v4l2_formats(text: str):
+    """
+    解析 `v4l2-ctl --list-formats-ext` 的輸出（只取 Discrete 尺寸 / 間隔）
+    :return: CameraMode 的 list
+    """
+    modes = []
+    fourcc = size = None
+    for line in text.splitlines():
+        m = re.search(r"\[\d+\]: '(\S{1,4})'", line)
+        if m:
+            fourcc, size = m.group(1), None
+            continue
+        m = re.search(r"Size: Discrete (\d+)x(\d+)", line)
+        if m:
+            size = (int(m.group(1)), int(m.group(2)))
+            continue
+        m = re.search(r"Interval: Discrete [\d.]+s \(([\d.]+) fps\)", line)
+        if m and fourcc and size:
+            modes.append(CameraMode(fourcc, size[0], size[1], float(m.group(1))))
+    return modes
+
+
+def list_modes(index: int):
+    """
+    用 v4l2-ctl 列出 /dev/video{index} 支援的模式
+    :return: CameraMode 的 list；沒有 v4l2-ctl（v4l-utils）或失敗時回傳空 list
+    """
+    try:
+        out = subprocess.run(
+            ["v4l2-ctl", "-d", f"/dev/video{index}", "--list-formats-ext"],
+            capture_output=True,
+            text=True,
+            timeout=2.0,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return []
+    if out.returncode != 0:
+        return []
+    return parse_v4l2_formats(out.stdout)
+
+
+def choose_mode(modes, width: int, height: int, fps: float, fourcc: str = "auto"):
+    """
+    依延遲 / FPS / CPU 成本挑模式
+    1) 能達到目標 FPS 的優先（frame 間隔就是最主要的延遲）
+    2) 尺寸：剛好 > 比目標大（最接近的）> 比目標小
+    3) 格式：依 FOURCC_PREFERENCE（fourcc 指定時只考慮該格式）
+    4) FPS 越接近目標越好（多出來的 frame 只是多耗 CPU / USB 頻寬）
+    :return: CameraMode；modes 為空或沒有符合的格式時回傳 None
+    """
+    if fourcc != "auto":
+        modes = [m for m in modes if m.fourcc == fourcc]
+    if not modes:
+        return None
+
+    area = width * height
+
+    def cost(m):
+        meets_fps = m.fps >= fps - 0.5
+        if (m.width, m.height) == (width, height):
+            size_rank = 0
+        elif m.width >= width and m.height >= height:
+            size_rank = 1
+        else:
+            size_rank = 2
+        if m.fourcc in FOURCC_PREFERENCE:
+            pref = FOURCC_PREFERENCE.index(m.fourcc)
+        else:
+            pref = len(FOURCC_PREFERENCE)
+        return (
+            0 if meets_fps else 1,
+            size_rank,
+            abs(m.width * m.height - area),
+            pref,
+            abs(m.fps - fps) if meets_fps else -m.fps,
+        )
+
+    return min(modes, key=cost)
 
 
 class Camera:
     """
     USB 攝影機封裝（OpenCV + V4L2）
     - 使用 config.py 的參數：
-      CAM_INDEX, CAM_WIDTH, CAM_HEIGHT, CAM_FPS
+      CAM_INDEX, CAM_WIDTH, CAM_HEIGHT, CAM_FPS, CAM_FOURCC
+    - 開啟時協商模式：列出攝影機支援的模式（v4l2-ctl，沒有就實際試設定），
+      依 choose_mode 的規則挑選後設定，再讀回驅動實際給的值（granted）
+    - measure()：實際量測送出的 FPS 與 frame 間隔抖動（同步，連讀 N 張）
+    - start_measure()：同樣的量測，但順著之後的 read() 記時間（不佔用啟動時間）
     """
 
-    def __init__(self):
+    def __init__(self, cfg=None):
+        cfg = cfg if cfg is not None else CONFIG
+
         # 使用 V4L2 後端開啟指定的攝影機 index（例如 0、1...）
-        self.cap = cv2.VideoCapture(CAM_INDEX, cv2.CAP_V4L2)
+        self.cap = cv2.VideoCapture(cfg.CAM_INDEX, cv2.CAP_V4L2)
 
         # 確認攝影機是否成功打開
         if not self.cap.isOpened():
-            raise RuntimeError(f"Could not open camera index {CAM_INDEX}")
+            raise RuntimeError(f"Could not open camera index {cfg.CAM_INDEX}")
+
+        # ===== 模式協商 =====
+        # v4l2-ctl 列不出來時，直接對驅動試兩種格式，看它實際給什麼
+        self.modes = list_modes(cfg.CAM_INDEX)
+        source = "v4l2-ctl"
+        if not self.modes:
+            self.modes = self._probe_modes(cfg.CAM_WIDTH, cfg.CAM_HEIGHT, cfg.CAM_FPS)
+            source = "probe"
+
+        mode = choose_mode(self.modes, cfg.CAM_WIDTH, cfg.CAM_HEIGHT, cfg.CAM_FPS, cfg.CAM_FOURCC)
+        if mode is None:
+            # 都失敗：照設定值要求（格式交給驅動決定）
+            fourcc = cfg.CAM_FOURCC if cfg.CAM_FOURCC != "auto" else None
+            mode = CameraMode(fourcc, cfg.CAM_WIDTH, cfg.CAM_HEIGHT, float(cfg.CAM_FPS))
 
-        # 設定影像寬高與 FPS（注意：部分攝影機可能不完全支援，實際值需再 query）
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAM_WIDTH)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAM_HEIGHT)
-        self.cap.set(cv2.CAP_PROP_FPS, CAM_FPS)
+        self.requested = mode
+        self.granted = self._apply(mode)
+        self.stats = None
+
+        # start_measure() 的狀態：read() 的時間戳記（None = 沒在量測）
+        self._stamps = None
+        self._measure_frames = 0
+        self._measure_expected = None
+
+        print(
+            f"[Camera] Mode ({source}, {len(self.modes)} modes): requested {self._fmt(mode)}, "
+            f"granted {self._fmt(self.granted)}"
+        )
+        g = self.granted
+        if (
+            (mode.fourcc and g.fourcc != mode.fourcc)
+            or (g.width, g.height) != (mode.width, mode.height)
+            or abs(g.fps - mode.fps) > 0.5
+        ):
+            print("[Camera] WARNING: driver did not grant the requested mode")
+        if self.granted.fps < cfg.CAM_FPS - 0.5:
+            print(f"[Camera] WARNING: running at {self.granted.fps:g} FPS (CAM_FPS = {cfg.CAM_FPS})")
+
+    @staticmethod
+    def _fmt(mode) -> str:
+        return f"{mode.fourcc or '?'} {mode.width}x{mode.height}@{mode.fps:g}"
+
+    def _apply(self, mode):
+        """
+        設定模式並讀回實際值
+        注意順序：V4L2 要先設 FOURCC 再設尺寸，否則格式切換可能把尺寸重設回預設
+        """
+        if mode.fourcc:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*mode.fourcc))
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, mode.width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, mode.height)
+        self.cap.set(cv2.CAP_PROP_FPS, mode.fps)
+
+        return CameraMode(
+            fourcc_to_str(self.cap.get(cv2.CAP_PROP_FOURCC)) or None,
+            int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            float(self.cap.get(cv2.CAP_PROP_FPS)),
+        )
+
+    def _probe_modes(self, width: int, height: int, fps: float):
+        """沒有 v4l2-ctl 時：每種格式試設定一次目標模式，記下驅動實際給的值"""
+        modes = []
+        for fourcc in FOURCC_PREFERENCE:
+            granted = self._apply(CameraMode(fourcc, width, height, float(fps)))
+            if granted.fourcc == fourcc and granted not in modes:
+                modes.append(granted)
+        return modes
 
     def read(self):
         """
@@ -30,7 +198,85 @@ class Camera:
           - ret: bool，是否成功
           - frame: 影像 ndarray（BGR）
         """
-        return self.cap.read()
+        ret, frame = self.cap.read()
+        if ret and self._stamps is not None:
+            self._stamps.append(time.monotonic())
+            if len(self._stamps) >= self._measure_frames:
+                stamps, self._stamps = self._stamps, None
+                self._report(stamps, self._measure_expected)
+        return ret, frame
+
+    def start_measure(self, frames: int = 15, expected: float = None) -> None:
+        """
+        被動量測：之後 frames 次成功的 read() 記下時間，收滿後印出結果並存到 self.stats
+        （主迴圈本來就在讀，不必在啟動時另外連讀 frames 張）
+        注意量到的是 frame 進到主迴圈的速率：主迴圈比攝影機慢時會被 CONTROL_HZ 限住
+        :param expected: 低於此 FPS 的 0.9 倍就警告；None 則用 granted FPS
+        """
+        self._stamps = [] if frames >= 3 else None
+        self._measure_frames = frames
+        self._measure_expected = expected
+
+    def warm_up(self, timeout: float = 2.0):
+        """
+        讀到第一張有效影像為止（USB 攝影機剛開啟時前幾次 read 可能失敗或很慢）
+        :param timeout: 最多等待秒數
+        :return: 第一張影像；逾時則回傳 None
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            ret, frame = self.cap.read()
+            if ret:
+                return frame
+        return None
+
+    def measure(self, frames: int = 15):
+        """
+        連續讀 frames 張影像，量測實際送出的 FPS 與 frame 間隔抖動
+        （自動曝光在暗處常把 FPS 砍半，設定值 / 讀回值都看不出來）
+        :return: (stats, last_frame)；stats = {"fps", "jitter_ms", "max_interval_ms", "frames"}，
+                 讀取失敗太多時 stats 為 None
+        """
+        stamps = []
+        frame = None
+        failures = 0
+        while len(stamps) < frames and failures < frames:
+            ret, img = self.cap.read()
+            if not ret:
+                failures += 1
+                continue
+            stamps.append(time.monotonic())
+            frame = img
+
+        return self._report(stamps), frame
+
+    def _report(self, stamps, expected: float = None):
+        """
+        由 frame 的時間戳記算 FPS / 抖動，印出並存到 self.stats
+        :return: stats；戳記不足 3 個時回傳 None
+        """
+        if len(stamps) < 3:
+            print("[Camera] WARNING: could not measure frame rate")
+            return None
+
+        expected = expected if expected is not None else self.granted.fps
+        intervals = [b - a for a, b in zip(stamps, stamps[1:])]
+        self.stats = {
+            "fps": len(intervals) / (stamps[-1] - stamps[0]),
+            "jitter_ms": statistics.pstdev(intervals) * 1000,
+            "max_interval_ms": max(intervals) * 1000,
+            "frames": len(stamps),
+        }
+        print(
+            f"[Camera] Measured {self.stats['fps']:.1f} FPS, jitter {self.stats['jitter_ms']:.1f} ms, "
+            f"max interval {self.stats['max_interval_ms']:.1f} ms"
+        )
+        if self.stats["fps"] < 0.9 * expected:
+            print(
+                f"[Camera] WARNING: delivering {self.stats['fps']:.1f} FPS of {expected:g} expected "
+                "(low light / auto exposure?)"
+            )
+        return self.stats
 
     def close(self):
         """
@@ -51,6 +297,9 @@ def _run_camera_test():
     cam = None
     try:
         cam = Camera()
+        for mode in cam.modes:
+            print(f"  {cam._fmt(mode)}")
+        cam.measure(60)
 
         while True:
             ret, frame = cam.read()
@@ -5,6 +5,9 @@ CAM_INDEX = 0
 CAM_WIDTH = 640
 CAM_HEIGHT = 480
 CAM_FPS = 30
+CAM_WARMUP_TIMEOUT = 2.0 # Seconds to wait for the first frame at startup
+CAM_FOURCC = "auto"      # "auto" (pick by FPS / size / CPU cost), "MJPG" or "YUYV"
+CAM_MEASURE_FRAMES = 15  # Frames timed over the first loop ticks to report real FPS / jitter (0 = skip)
 
 # --- Vision Settings ---
 # ROI (Region of Interest) - Only process the bottom part of the image
@@ -16,8 +19,33 @@ ROI_Y_END_RATIO = 1.0
 THRESH_VAL = 80          # 0-255, adjust based on lighting
 INVERT_THRESH = True     # True for black line on white background (THRESH_BINARY_INV)
 
+# Line selection (connected components) - follow one blob instead of averaging all white pixels
+LINE_SELECT = True       # False = legacy centroid of the whole mask
+CC_SCALE = 0.25          # Mask downscale before labelling (fixed cost, 640x480 -> 160x120)
+CC_MAX_CANDIDATES = 4    # Only the N largest blobs are scored (bounded per-frame cost)
+CC_MIN_AREA = 0.002      # Ignore blobs smaller than this fraction of the ROI
+CC_POS_WEIGHT = 1.0      # Score: distance from the previous line position (error units)
+CC_HEADING_WEIGHT = 0.5  # Score: heading change from the previous line (radians)
+
+# Bird's-eye (ground plane) correction - error from metres on the floor instead of image pixels
+BIRDSEYE = "off"         # "off", "points" (transform a few line points) or "remap" (warp the whole ROI)
+BIRDSEYE_FILE = "calib/birdseye.json"  # Image <-> ground point pairs (see src/birdseye.py)
+BIRDSEYE_HALF_WIDTH = 0.15  # Lateral offset (m) that maps to error = +/-1
+
+# Frame-change detection - reuse the last result when the ROI is effectively unchanged
+FRAME_REUSE = True       # Skip the vision pipeline for unchanged frames (stopped / duplicated frames)
+FRAME_REUSE_MAD = 1.0    # Mean abs difference (gray levels) on a 32x24 thumbnail that counts as unchanged
+FRAME_REUSE_MAX_AGE = 5  # Max consecutive reused frames before a full pass is forced
+
 # Safety
-MIN_CONFIDENCE = 0.00     # Minimum ratio of white pixels to be considered a line
+MIN_CONFIDENCE = 0.01     # Minimum ratio of line pixels to be considered a line (0 disables loss recovery)
+
+# --- Line-Loss Recovery ---
+# Lost line -> COAST (keep last command) -> SEARCH (turn toward last error) -> STOP
+LOST_COAST_TIME = 0.3    # Seconds to keep driving on the last heading
+LOST_SEARCH_TIME = 1.5   # Seconds to search toward the last known error side
+SEARCH_SPEED = 0.15      # Base speed while searching
+SEARCH_STEER = 0.3       # Steering while searching (sign taken from last error)
 
 # --- Control Settings ---
 CONTROL_HZ = 30          # Frequency of the control loop
@@ -25,13 +53,67 @@ BASE_SPEED = 0.2         # 0.0 to 1.0 (Safety base speed)
 KP = 0.23                 # Proportional gain
 KD = 1.5                # Derivative gain
 STEER_LIMIT = 0.5        # Limit steering influence (prevent wheel spin)
-SLEW_RATE = 0.3         # Max change in motor output per update (for smooth accel)
+SLEW_RATE = 9.0          # Max change in motor output per second (= 0.3 per update @ 30 Hz)
+
+# Loop timing (measured dt)
+DT_MIN = 0.001           # Lower clamp for measured loop period (s)
+DT_MAX = 0.1             # Upper clamp, so one long stall does not blow up D / slew (s)
+D_FILTER_TAU = 0.0       # Low-pass time constant of the D term (s), 0 = unfiltered
+
+# --- Speed Scheduling ---
+# When enabled, base speed ramps from SPEED_MIN toward SPEED_MAX on straights
+# (low error variance / small error / high confidence) and KP/KD are
+# interpolated from GAIN_TABLE by the current speed.
+SPEED_SCHEDULE = False
+SPEED_MIN = 0.2          # Speed in curves / when unsure (same as BASE_SPEED)
+SPEED_MAX = 0.8          # Speed on straights (keep <= L298NMotor.SPEED_LIMIT)
+SPEED_WINDOW = 10        # Number of recent errors used for the variance
+SPEED_ERR_VAR_MAX = 0.02 # Error variance at/above this -> SPEED_MIN
+SPEED_ERR_ABS_MAX = 0.4  # |error| at/above this -> SPEED_MIN
+SPEED_ERR_RATE_MAX = 3.0 # |d error / dt| (1/s) at/above this -> SPEED_MIN (curve ahead)
+SPEED_CONF_FULL = 0.03   # Confidence at/above this counts as a solid line
+SPEED_RAMP_UP = 0.6      # Max speed increase per second
+SPEED_RAMP_DOWN = 3.0    # Max speed decrease per second (brake early)
+
+# (speed, KP, KD), sorted by speed; gains are linearly interpolated
+GAIN_TABLE = (
+    (0.2, 0.23, 1.5),
+    (0.5, 0.20, 2.0),
+    (0.8, 0.16, 2.6),
+)
+
+# --- Runtime Tuning (hot reload) ---
+# Changes are applied at tick boundaries; camera / PCA / pin settings need a restart.
+CONFIG_FILE = "tuning.json"  # JSON overrides, re-read when its mtime changes
+CONFIG_PORT = 8765           # UDP port on 127.0.0.1 for JSON updates (0 = off)
+
+# --- Telemetry / Display ---
+TELEMETRY_PORT = 8766        # TCP port on 127.0.0.1 for live telemetry (0 = off)
+TELEMETRY_FRAME_HZ = 5.0     # Max rate of JPEG debug/mask frames sent to clients
+TELEMETRY_JPEG_QUALITY = 70  # 0-100
+TELEMETRY_QUEUE = 64         # Per-client queue; messages are dropped when full
+SHOW_WINDOWS = False         # cv2.imshow debug windows (needs a display, slows the loop)
+
+# --- Sampling Profiler (kill -USR1 <pid> to start, -USR2 to stop and write) ---
+PROFILE_HZ = 100             # Stack samples per second of the main thread
+PROFILE_MAX_OVERHEAD = 0.02  # Max fraction of time spent sampling (rate is lowered to fit)
+PROFILE_DIR = "profiles"     # Collapsed-stack output (flamegraph.pl / speedscope)
 
 # --- PCA9685 Settings ---
 PCA_ADDR = 0x40
 PCA_FREQ = 200           # Hz, suitable for L298N
+# I2C error handling (per control tick)
+I2C_RETRIES = 2             # Retries per transaction
+I2C_TICK_RETRY_BUDGET = 8   # Max retries per tick across all transactions
+I2C_TICK_DEADLINE = 0.015   # s after tick start (~24 byte writes fit); later writes wait for the next tick
+WARM_START = True        # Skip PCA9685 reset / prescale rewrite when the chip is already set up
+WATCHDOG_TIMEOUT = 0.25  # s without a control tick before all PWM outputs are cut (0 = disabled)
+
+I2C_BUS = None           # None = auto-detect (find_pca_bus, cached per board); int forces a bus
 
-I2C_BUS = 7
+# Per-wheel speed -> PCA count tables (python3 motor_test_l298n.py calibrate)
+# Missing file = legacy MIN_POWER deadband + linear mapping.
+MOTOR_LUT_FILE = "calib/motor_lut.json"
 
 # --- L298N Hardware Mapping (PCA Channel IDs) ---
 # Left Motor
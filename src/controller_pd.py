@@ -1,5 +1,5 @@
 # src/controller_pd.py
-from .config import *
+from .runtime_config import CONFIG
 
 
 class PDController:
@@ -9,32 +9,79 @@ class PDController:
     - 輸出：left_cmd, right_cmd（理想上 -1.0 ~ 1.0），給左右輪的速度指令
     """
 
-    def __init__(self):
-        # 上一次的誤差，用於計算微分項 D
-        self.prev_error = 0.0
+    def __init__(self, cfg=None):
+        # 執行期設定（可熱更新）；未指定則使用全域 CONFIG
+        self.cfg = cfg if cfg is not None else CONFIG
 
-    def step(self, error: float):
+        # 上一次的誤差，用於計算微分項 D（None：剛開始 / 剛 reset，還沒有上一筆）
+        self.prev_error = None
+
+        # 低通濾波後的微分項（D_FILTER_TAU > 0 時才有平滑效果）
+        self.d_filtered = 0.0
+
+    def step(self, error: float, dt: float = None,
+             base_speed: float = None, kp: float = None, kd: float = None):
         """
         計算一次控制輸出
         :param error: 當前誤差（-1.0 ~ 1.0）
+        :param dt: 實際量測的迴圈週期（秒）；None 則視為理想週期 1/CONTROL_HZ
+        :param base_speed, kp, kd: 速度排程（SpeedScheduler）給的值；None 則用 config
         :return: (left_cmd, right_cmd)
         """
+        cfg = self.cfg
+
+        if base_speed is None:
+            base_speed = cfg.BASE_SPEED
+        if kp is None:
+            kp = cfg.KP
+        if kd is None:
+            kd = cfg.KD
+
+        nominal_dt = 1.0 / cfg.CONTROL_HZ
+        if dt is None:
+            dt = nominal_dt
+        dt = max(cfg.DT_MIN, min(cfg.DT_MAX, dt))
 
         # ===== 1) PD 計算 =====
         # P 項：KP * error
-        # D 項：KD * (error - prev_error)
-        d_error = error - self.prev_error
-        steer = (KP * error) + (KD * d_error)
+        # D 項：KD * de/dt，再乘上理想週期
+        #   -> 週期剛好是 1/CONTROL_HZ 時等同原本的 KD * (error - prev_error)，
+        #      既有 KD 數值不需重調；迴圈變慢/抖動時 D 項不會跟著放大或縮小
+        #   -> reset 後第一筆沒有上一次誤差：D 項為 0（不把整個 error 當成跳變）
+        if self.prev_error is None:
+            d_error = 0.0
+        else:
+            d_error = (error - self.prev_error) / dt * nominal_dt
+
+        # D 項一階低通：alpha = dt / (tau + dt)
+        if cfg.D_FILTER_TAU > 0.0:
+            alpha = dt / (cfg.D_FILTER_TAU + dt)
+            self.d_filtered += alpha * (d_error - self.d_filtered)
+        else:
+            self.d_filtered = d_error
+
+        steer = (kp * error) + (kd * self.d_filtered)
 
         # 更新 prev_error，供下次 step 使用
         self.prev_error = error
 
+        return self.mix(base_speed, steer)
+
+    def mix(self, base_speed: float, steer: float):
+        """
+        轉向量 + 基礎速度 → 左右輪命令（step 與掉線搜尋模式共用）
+        :param base_speed: 基礎前進速度
+        :param steer: 轉向量（正值 = 往右轉，與 error 同號）
+        :return: (left_cmd, right_cmd)
+        """
+        cfg = self.cfg
+
         # ===== 2) 轉向量限制（避免轉太大）=====
-        steer = max(-STEER_LIMIT, min(STEER_LIMIT, steer))
+        steer = max(-cfg.STEER_LIMIT, min(cfg.STEER_LIMIT, steer))
 
         # ===== 3) 差速控制（Differential Drive）=====
-        left_cmd = BASE_SPEED + steer
-        right_cmd = BASE_SPEED - steer
+        left_cmd = base_speed + steer
+        right_cmd = base_speed - steer
 
         # ===== 4) 最終輸出限制到 [-1.0, 1.0] =====
         left_cmd = max(-1.0, min(1.0, left_cmd))
@@ -43,4 +90,9 @@ class PDController:
         left_cmd = -left_cmd
         right_cmd = -right_cmd
 
-        return left_cmd, right_cmd
\ No newline at end of file
+        return left_cmd, right_cmd
+
+    def reset(self) -> None:
+        """清除微分狀態（重新抓到線時使用，避免 D 項因誤差跳變而暴衝）"""
+        self.prev_error = None
+        self.d_filtered = 0.0
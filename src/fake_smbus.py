@@ -0,0 +1,149 @@
+# src/fake_smbus.py
+import errno
+
+
+class FakePCA9685:
+    """
+    記憶體中的 PCA9685（256 個暫存器）
+    - 上電預設值依 datasheet（MODE1=0x11 sleep、PRESCALE=0x1E、ALLCALLADR=0xE0、各通道 full-off）
+    - 寫 ALL_LED_* 會同步到 16 個通道
+    - PRESCALE 只有在 SLEEP=1 時才能寫入（與實機相同）
+    給 find_pca_bus / PCA9685 / 模擬器在沒有硬體時使用
+    """
+
+    MODE1 = 0x00
+    ALLCALLADR = 0x05
+    LED0_ON_L = 0x06
+    ALL_LED_ON_L = 0xFA
+    PRESCALE = 0xFE
+
+    def __init__(self):
+        self.regs = bytearray(256)
+        self.power_on()
+
+        # 故障注入：接下來 fail_count 次存取丟出 OSError(EIO)（模擬馬達 EMI 造成的 bus 錯誤）
+        self.fail_count = 0
+
+    def inject_errors(self, count: int) -> None:
+        """讓接下來 count 次讀寫失敗"""
+        self.fail_count = count
+
+    def _maybe_fail(self) -> None:
+        if self.fail_count > 0:
+            self.fail_count -= 1
+            raise OSError(errno.EIO, "Input/output error")
+
+    def power_on(self) -> None:
+        """回到上電預設狀態"""
+        self.regs[:] = bytes(256)
+        self.regs[self.MODE1] = 0x11
+        self.regs[0x01] = 0x04
+        self.regs[0x02:0x05] = bytes((0xE2, 0xE4, 0xE8))
+        self.regs[self.ALLCALLADR] = 0xE0
+        self.regs[self.PRESCALE] = 0x1E
+        for ch in range(16):
+            self.regs[self.LED0_ON_L + 4 * ch + 3] = 0x10
+
+    def read(self, reg: int) -> int:
+        self._maybe_fail()
+        return self.regs[reg & 0xFF]
+
+    def write(self, reg: int, val: int) -> None:
+        self._maybe_fail()
+        reg &= 0xFF
+        val &= 0xFF
+
+        if reg == self.PRESCALE:
+            if self.regs[self.MODE1] & 0x10:
+                self.regs[reg] = val
+            return
+
+        if reg == self.MODE1:
+            # RESTART 寫 1 之後晶片會自行清除
+            self.regs[reg] = val & 0x7F
+            return
+
+        if self.ALL_LED_ON_L <= reg < self.ALL_LED_ON_L + 4:
+            offset = reg - self.ALL_LED_ON_L
+            for ch in range(16):
+                self.regs[self.LED0_ON_L + 4 * ch + offset] = val
+
+        self.regs[reg] = val
+
+    def channel(self, ch: int):
+        """
+        讀出某通道的 (on, off) 計數（含 bit12 的 full-on / full-off 旗標）
+        """
+        base = self.LED0_ON_L + 4 * ch
+        on = self.regs[base] | (self.regs[base + 1] << 8)
+        off = self.regs[base + 2] | (self.regs[base + 3] << 8)
+        return on, off
+
+    def duty(self, ch: int) -> float:
+        """某通道目前的 duty（0.0 ~ 1.0），full-off 優先於 full-on（與 datasheet 相同）"""
+        on, off = self.channel(ch)
+        if off & 0x1000:
+            return 0.0
+        if on & 0x1000:
+            return 1.0
+        return ((off - on) % 4096) / 4096.0
+
+
+class FakeSMBus:
+    """
+    smbus2.SMBus 的替身（只實作本專案用到的 byte 讀寫）
+    - 先用 FakeSMBus.attach(bus_num, address, device) 掛上裝置
+    - 開啟不存在的 bus → FileNotFoundError；存取不存在的位址 → OSError(ENXIO)
+    - 同一個 bus 的多個 handle 共用同一組裝置（與實機 /dev/i2c-N 相同）
+    """
+
+    # bus_num -> {address: device}
+    _buses = {}
+
+    @classmethod
+    def attach(cls, bus_num: int, address: int = 0x40, device=None):
+        """在指定 bus 上掛一個裝置（預設為 FakePCA9685），回傳該裝置"""
+        device = device if device is not None else FakePCA9685()
+        cls._buses.setdefault(bus_num, {})[address] = device
+        return device
+
+    @classmethod
+    def add_bus(cls, bus_num: int) -> None:
+        """建立一條空的 bus（沒有任何裝置回應）"""
+        cls._buses.setdefault(bus_num, {})
+
+    @classmethod
+    def reset(cls) -> None:
+        """移除所有 bus 與裝置"""
+        cls._buses.clear()
+
+    @classmethod
+    def bus_numbers(cls):
+        return sorted(cls._buses)
+
+    def __init__(self, bus: int = None):
+        if bus not in self._buses:
+            raise FileNotFoundError(errno.ENOENT, f"No such file or directory: '/dev/i2c-{bus}'")
+        self.bus = bus
+        self._devices = self._buses[bus]
+
+    def _device(self, address: int):
+        device = self._devices.get(address)
+        if device is None:
+            raise OSError(errno.ENXIO, "No such device or address")
+        return device
+
+    def read_byte_data(self, i2c_addr: int, register: int) -> int:
+        return self._device(i2c_addr).read(register)
+
+    def write_byte_data(self, i2c_addr: int, register: int, value: int) -> None:
+        self._device(i2c_addr).write(register, value)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,189 @@
+# src/i2c_transport.py
+import time
+
+
+class I2CError(OSError):
+    """I2C 交易失敗（重試用完 / 超過本 tick 期限）"""
+
+
+class BusStats:
+    """
+    I2C 匯流排健康度統計
+    - transactions：成功的交易數
+    - errors：失敗次數（每次嘗試都算）
+    - retries：重試次數
+    - deferred：因超過 tick 期限而延後到下個 tick 的寫入
+    - resyncs：錯誤後補寫的暫存器數
+    - latency：每筆交易（含重試）的耗時
+    """
+
+    # 延遲分佈的上界（秒），最後一格為「以上」
+    BUCKETS = (0.0005, 0.001, 0.002, 0.005)
+
+    def __init__(self):
+        self.transactions = 0
+        self.errors = 0
+        self.retries = 0
+        self.deferred = 0
+        self.resyncs = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.histogram = [0] * (len(self.BUCKETS) + 1)
+
+    def record_latency(self, seconds: float) -> None:
+        self.latency_total += seconds
+        self.latency_max = max(self.latency_max, seconds)
+        for i, limit in enumerate(self.BUCKETS):
+            if seconds < limit:
+                self.histogram[i] += 1
+                return
+        self.histogram[-1] += 1
+
+    def as_dict(self) -> dict:
+        count = sum(self.histogram)
+        return {
+            "transactions": self.transactions,
+            "errors": self.errors,
+            "retries": self.retries,
+            "deferred": self.deferred,
+            "resyncs": self.resyncs,
+            "latency_avg_ms": (self.latency_total / count * 1000) if count else 0.0,
+            "latency_max_ms": self.latency_max * 1000,
+        }
+
+    def summary(self) -> str:
+        d = self.as_dict()
+        buckets = " ".join(
+            f"<{limit * 1000:g}ms:{n}" for limit, n in zip(self.BUCKETS, self.histogram)
+        ) + f" >={self.BUCKETS[-1] * 1000:g}ms:{self.histogram[-1]}"
+        return (
+            f"tx={d['transactions']} err={d['errors']} retry={d['retries']} "
+            f"deferred={d['deferred']} resync={d['resyncs']} "
+            f"avg={d['latency_avg_ms']:.2f}ms max={d['latency_max_ms']:.2f}ms [{buckets}]"
+        )
+
+
+class I2CTransport:
+    """
+    有延遲上限的 I2C 暫存器讀寫
+    - 每筆交易最多重試 retries 次，但同一個 tick 內的重試總數不超過 tick_retry_budget
+    - begin_tick() 之後 tick_deadline 秒內才會嘗試重試；超過就放棄，不讓壞掉的 bus 拖住控制迴圈
+    - 所有寫入都記在 shadow；寫入失敗或被延後的暫存器標記為 dirty，
+      下一個 begin_tick() 時依 shadow 補寫（re-sync），通道不會停在未知狀態
+    - read8 失敗直接丟 I2CError（不再回傳 0 讓呼叫端誤用）
+    - begin_tick() 之前 / end_tick() 之後（初始化、清理停車）沒有期限，只受 retries 限制
+    """
+
+    # 錯誤訊息最短間隔（秒），避免 EMI 時每 tick 洗版
+    LOG_INTERVAL = 1.0
+
+    def __init__(self, bus, address: int, retries: int = 2,
+                 tick_retry_budget: int = 8, tick_deadline: float = 0.015):
+        self.bus = bus
+        self.address = address
+        self.retries = retries
+        self.tick_retry_budget = tick_retry_budget
+        self.tick_deadline = tick_deadline
+
+        # 最後一次「想要」寫入的值，與尚未確認寫進硬體的暫存器
+        self.shadow = {}
+        self.dirty = set()
+
+        self.stats = BusStats()
+
+        self._budget = None     # None = 不限（不在 tick 內）
+        self._deadline = None
+        self._last_log = 0.0
+
+    # ===== tick 邊界 =====
+    def begin_tick(self, now: float = None) -> None:
+        """
+        主迴圈每個 tick 開始輸出前呼叫：重設重試額度 / 期限，並補寫 dirty 暫存器
+        """
+        now = time.monotonic() if now is None else now
+        self._budget = self.tick_retry_budget
+        self._deadline = now + self.tick_deadline
+
+        if self.dirty:
+            self.resync()
+
+    def end_tick(self) -> None:
+        """tick 輸出結束：回到不限額度 / 無期限（清理、停車等迴圈外的寫入一定會送出）"""
+        self._budget = None
+        self._deadline = None
+
+    def expired(self) -> bool:
+        """本 tick 的期限是否已過"""
+        return self._deadline is not None and time.monotonic() > self._deadline
+
+    def resync(self) -> None:
+        """依 shadow 補寫 dirty 暫存器（由小到大，同通道 L/H 順序不變）"""
+        for reg in sorted(self.dirty):
+            if self.expired():
+                return
+            if self._transfer(self.bus.write_byte_data, reg, self.shadow[reg]):
+                self.dirty.discard(reg)
+                self.stats.resyncs += 1
+
+    # ===== 讀寫 =====
+    def defer(self, reg: int, val: int) -> None:
+        """只更新 shadow、不碰匯流排（下個 tick re-sync 時才寫）"""
+        self.shadow[reg] = val & 0xFF
+        self.dirty.add(reg)
+        self.stats.deferred += 1
+
+    def write8(self, reg: int, val: int) -> bool:
+        """
+        寫入單一 byte
+        :return: 是否成功；失敗時該暫存器會在下個 tick 補寫
+        """
+        val &= 0xFF
+        self.shadow[reg] = val
+
+        if self._transfer(self.bus.write_byte_data, reg, val):
+            self.dirty.discard(reg)
+            return True
+
+        self.dirty.add(reg)
+        return False
+
+    def read8(self, reg: int) -> int:
+        """讀取單一 byte；失敗時丟 I2CError"""
+        result = []
+        if not self._transfer(lambda addr, r: result.append(self.bus.read_byte_data(addr, r)), reg):
+            raise I2CError(f"read of register {hex(reg)} at {hex(self.address)} failed")
+        return result[0]
+
+    def _transfer(self, fn, reg: int, *args) -> bool:
+        """執行一筆交易（含重試），記錄延遲與錯誤"""
+        t0 = time.perf_counter()
+        attempt = 0
+
+        while True:
+            try:
+                fn(self.address, reg, *args)
+                self.stats.transactions += 1
+                self.stats.record_latency(time.perf_counter() - t0)
+                return True
+            except OSError as e:
+                self.stats.errors += 1
+                self._log(f"reg {hex(reg)}: {e}")
+
+            # 是否還能重試：單筆次數、本 tick 額度、本 tick 期限
+            attempt += 1
+            if attempt > self.retries or self.expired():
+                break
+            if self._budget is not None:
+                if self._budget <= 0:
+                    break
+                self._budget -= 1
+            self.stats.retries += 1
+
+        self.stats.record_latency(time.perf_counter() - t0)
+        return False
+
+    def _log(self, msg: str) -> None:
+        now = time.monotonic()
+        if now - self._last_log >= self.LOG_INTERVAL:
+            self._last_log = now
+            print(f"[I2C] Error ({msg}) - total errors: {self.stats.errors}")
@@ -1,15 +1,36 @@
 # src/main.py
-import cv2
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 # 以 module 方式執行（python3 -m src.main）時的相對匯入
-from .config import *
-from .pca9685_smbus import PCA9685
+# 注意：用到 cv2 的模組（camera / vision / telemetry）延後到相機執行緒才匯入，
+#       讓 cv2 的匯入時間與 I2C 初始化重疊
+from .runtime_config import CONFIG
+from .pca9685_smbus import PCA9685, find_pca_bus
 from .motors_l298n import MotorDriver
-from .camera_usb import Camera
-from .vision_line import Vision
-from .controller_pd import PDController
+from .pilot import Pilot
+from .profiler import SamplingProfiler
+from .recovery import LineRecovery
+from .watchdog import MotorWatchdog
+
+
+def _open_camera(cfg):
+    """
+    背景執行緒：匯入 cv2、開啟攝影機（含模式協商）並讀到第一張影像（與 PCA9685 初始化並行）
+    CAM_MEASURE_FRAMES > 0 時，實際 FPS / 抖動改在主迴圈前幾個 tick 的 read() 量測
+    （不佔用啟動時間；攝影機給不到 CAM_FPS 時約半秒後就會看到警告）
+    :return: (cam, first_frame, elapsed_seconds)
+    """
+    t0 = time.monotonic()
+    from .camera_usb import Camera
+
+    cam = Camera(cfg)
+    frame = cam.warm_up(cfg.CAM_WARMUP_TIMEOUT)
+    if frame is not None and cfg.CAM_MEASURE_FRAMES > 0:
+        # 主迴圈以 CONTROL_HZ 讀取：量到的速率最多就是 CONTROL_HZ
+        cam.start_measure(cfg.CAM_MEASURE_FRAMES, min(cam.granted.fps, cfg.CONTROL_HZ))
+    return cam, frame, time.monotonic() - t0
 
 
 def main():
@@ -21,50 +42,120 @@ def main():
       3) 初始化控制（PD）
       4) 以固定 CONTROL_HZ 迴圈：
          - 讀影像 → Vision 算 error/conf
-         - conf 太低：停車（安全機制）
+         - conf 太低：掉線恢復（滑行 → 搜尋 → 停車）
          - 否則：PD 產生左右輪命令 → 馬達輸出
     """
     print("Initializing Line Follower...")
+    t_start = time.monotonic()
+
+    # 執行期設定：可在執行中由 CONFIG_FILE / UDP CONFIG_PORT 熱更新
+    cfg = CONFIG
+
+    # ===== 0) 攝影機在背景執行緒開啟（含 cv2 匯入與第一張影像暖機）=====
+    cam_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cam-init")
+    cam_future = cam_executor.submit(_open_camera, cfg)
 
     # ===== 1) 初始化 PCA9685（I2C PWM 控制器）=====
     # 使用 config.py：I2C_BUS / PCA_ADDR / PCA_FREQ
-    pca = PCA9685(I2C_BUS, PCA_ADDR)
-    pca.set_frequency(PCA_FREQ)
+    # I2C_BUS=None：自動偵測（結果依板子型號快取，之後啟動不需再掃描）
+    # WARM_START：晶片已醒著且 PRESCALE 已是目標值時，跳過 reset / 重設頻率
+    t0 = time.monotonic()
+    bus_num = cfg.I2C_BUS if cfg.I2C_BUS is not None else find_pca_bus(cfg.PCA_ADDR)
+    if bus_num is None:
+        print("PCA9685 not found. Set I2C_BUS in config.py.")
+        cam_executor.shutdown(wait=False)
+        return
+
+    pca = PCA9685(
+        bus_num,
+        cfg.PCA_ADDR,
+        warm_start=cfg.WARM_START,
+        retries=cfg.I2C_RETRIES,
+        tick_retry_budget=cfg.I2C_TICK_RETRY_BUDGET,
+        tick_deadline=cfg.I2C_TICK_DEADLINE,
+    )
+    pca.set_frequency(cfg.PCA_FREQ, skip_if_set=cfg.WARM_START)
+    pca_time = time.monotonic() - t0
 
     # ===== 2) 初始化馬達驅動（L298N + PCA9685）=====
     motors = MotorDriver(pca)
 
-    # ===== 3) 初始化攝影機 =====
+    # ===== 3) 等待攝影機 =====
     cam = None
     try:
-        cam = Camera()
+        cam, first_frame, cam_time = cam_future.result()
     except RuntimeError as e:
         print(e)
         return
+    finally:
+        cam_executor.shutdown(wait=False)
+
+    # cv2 已在相機執行緒匯入完成，這裡匯入不會再花時間
+    import cv2
+    from .vision_line import Vision
+    from .telemetry import TelemetryServer
 
     # ===== 4) 初始化視覺與控制器 =====
     vision = Vision()
-    controller = PDController()
+    pilot = Pilot()
+
+    # 開始監看設定檔 / UDP（變更只會在 tick 邊界套用）
+    try:
+        cfg.start_watcher(cfg.CONFIG_FILE, cfg.CONFIG_PORT)
+    except OSError as e:
+        print(f"[Config] Hot reload disabled: {e}")
+
+    # 遙測伺服器（背景執行緒；無 client 時 publish 幾乎零成本）
+    telemetry = None
+    if cfg.TELEMETRY_PORT:
+        try:
+            telemetry = TelemetryServer(cfg.TELEMETRY_PORT)
+            telemetry.start()
+        except OSError as e:
+            print(f"[Telemetry] Disabled: {e}")
+            telemetry = None
+
+    # 馬達看門狗：自己的執行緒 + 自己的 I2C handle，主迴圈停住時切斷輸出
+    watchdog = None
+    if cfg.WATCHDOG_TIMEOUT > 0:
+        watchdog = MotorWatchdog(bus_num, cfg.PCA_ADDR, cfg.WATCHDOG_TIMEOUT)
+        watchdog.start()
 
-    print("System Ready. Press 'q' in window or Ctrl+C to stop.")
+    # 取樣 profiler：kill -USR1 <pid> 開始、kill -USR2 <pid> 停止並寫出 PROFILE_DIR/*.folded
+    profiler = SamplingProfiler()
+    profiler.install_signals()
+
+    print("System Ready. Press 'q' in window (SHOW_WINDOWS) or Ctrl+C to stop.")
 
     # ===== 5) 迴圈節流：以 CONTROL_HZ 控制更新頻率 =====
-    # dt：每次迴圈最短間隔
-    dt = 1.0 / CONTROL_HZ
-    last_time = time.time()
+    # 第一個 tick 不等待，直接用暖機讀到的影像
+    last_time = time.monotonic() - 1.0 / cfg.CONTROL_HZ
 
     try:
         while True:
             # --- A) 迴圈 timing（節流到 CONTROL_HZ）---
-            now = time.time()
-            if now - last_time < dt:
+            # period：每次迴圈最短間隔（CONTROL_HZ 可熱更新，每次重算）
+            period = 1.0 / cfg.CONTROL_HZ
+            now = time.monotonic()
+            if now - last_time < period:
                 # 還沒到下一個週期，稍微 sleep 讓出 CPU
                 time.sleep(0.001)
                 continue
+
+            # dt：實際量測到的週期（相機慢一格、I2C 重試時會比 period 長），
+            # 傳給 PD 與馬達，讓 D 項與 slew rate 以「每秒」計算
+            dt = now - last_time
             last_time = now
 
+            # tick 邊界：一次套用所有待生效的設定變更
+            pilot.on_config_change(cfg.apply_pending())
+
             # --- B) 感知：讀影像 + Vision 算誤差/可信度 ---
-            ret, frame = cam.read()
+            if first_frame is not None:
+                ret, frame = True, first_frame
+                first_frame = None
+            else:
+                ret, frame = cam.read()
             if not ret:
                 print("Failed to capture image")
                 break
@@ -72,25 +163,69 @@ def main():
             error, conf, mask, debug = vision.process(frame)
 
             # --- C) 安全 + 控制 ---
-            # 若 conf 太低，視為「找不到線」，立刻停車
-            if conf < MIN_CONFIDENCE:
-                print(f"Lost Line! (Conf: {conf:.2f}) - STOP")
-                motors.stop()
-            else:
-                # PD 控制器輸出左右輪命令
-                left_cmd, right_cmd = controller.step(error)
-                motors.set(left_cmd, right_cmd)
+            # 看門狗切斷過輸出（停頓多半發生在讀影像 / Vision）：在送出輸出前檢查，
+            # 從靜止重新加速，PD 不用停頓前的歷史
+            if watchdog is not None:
+                stall = watchdog.consume_trip()
+                if stall is not None:
+                    print(f"[Watchdog] Control loop stalled {stall * 1000:.0f} ms; resuming from stop")
+                    motors.reset()
+                    pilot.controller.reset()
+                    # 停頓的長度不是控制週期：這個 tick 以標準週期計算 slew，真正從靜止爬升
+                    dt = period
 
-                # 監看用輸出（保持你原本的 print 行為）
-                print(f"Err: {error:.2f} | L: {left_cmd:.2f} | R: {right_cmd:.2f}")
+            # I2C：重設本 tick 的重試額度 / 期限，並補寫上個 tick 失敗的暫存器
+            pca.begin_tick()
 
-            # --- D) 可視化（目前保留註解，功能不變）---
-            # cv2.imshow("Debug", debug)
-            # cv2.imshow("Mask", mask)
+            # 決策：掉線恢復 + 速度排程 + PD（與模擬器共用 Pilot）
+            state, speed, left_cmd, right_cmd = pilot.step(error, conf, now, dt)
 
-            # 注意：即使沒有 imshow，waitKey 仍可用來接收鍵盤（但視窗沒開時意義較小）
-            if cv2.waitKey(1) & 0xFF == ord("q"):
-                break
+            # STOPPED 時命令為 (0, 0)，等同 motors.stop(dt)
+            motors.set(left_cmd, right_cmd, dt)
+
+            if state == LineRecovery.TRACKING:
+                # 監看用輸出
+                print(f"Err: {error:.2f} | V: {speed:.2f} | L: {left_cmd:.2f} | R: {right_cmd:.2f}")
+
+            pca.end_tick()
+            if watchdog is not None:
+                watchdog.pet()
+
+            # 啟動時間報告（只在第一個命令送出後印一次）
+            if t_start is not None:
+                print(
+                    f"[Startup] Time to first command: {(time.monotonic() - t_start) * 1000:.0f} ms "
+                    f"(PCA9685 {pca_time * 1000:.0f} ms{' warm' if pca.warm else ''}, "
+                    f"camera {cam_time * 1000:.0f} ms, in parallel)"
+                )
+                t_start = None
+
+            # --- D) 遙測（只放進 queue，編碼 / 傳送都在背景執行緒）---
+            if telemetry is not None:
+                telemetry.publish(
+                    {
+                        "t": now,
+                        "dt": dt,
+                        "err": error,
+                        "conf": conf,
+                        "state": state,
+                        "speed": speed,
+                        "left": left_cmd,
+                        "right": right_cmd,
+                        "cfg": cfg.version,
+                        "i2c_err": pca.stats.errors,
+                        "wd_trips": watchdog.trips if watchdog is not None else 0,
+                    },
+                    debug,
+                    mask,
+                )
+
+            # --- E) 本機視窗（預設關閉；headless 時不呼叫任何 GUI 函式）---
+            if cfg.SHOW_WINDOWS:
+                cv2.imshow("Debug", debug)
+                cv2.imshow("Mask", mask)
+                if cv2.waitKey(1) & 0xFF == ord("q"):
+                    break
 
     except KeyboardInterrupt:
         print("\nCtrl+C detected.")
@@ -101,6 +236,20 @@ def main():
         # ===== 6) 清理資源（確保安全停車）=====
         print("Cleaning up...")
 
+        cfg.stop_watcher()
+        if telemetry is not None:
+            telemetry.stop()
+
+        # 取樣中就結束：照樣寫出目前為止的結果
+        profiler.stop()
+
+        # 清理時的停車寫入不需要看門狗（也避免兩邊同時寫）
+        if watchdog is not None:
+            watchdog.close()
+
+        # 迴圈中途離開時 tick 期限可能還在：先解除，確保停車寫入一定送出
+        pca.end_tick()
+
         # 停止馬達輸出（使用你 MotorDriver 的 stop）
         motors.stop()
 
@@ -112,8 +261,14 @@ def main():
             cam.close()
 
         # 關閉 OpenCV 視窗
-        cv2.destroyAllWindows()
+        if cfg.SHOW_WINDOWS:
+            cv2.destroyAllWindows()
 
+        print(f"[I2C] {pca.stats.summary()}")
+        if cfg.FRAME_REUSE:
+            print(f"[Vision] Frame reuse: hits={vision.reuse_hits} misses={vision.reuse_misses}")
+        if watchdog is not None:
+            print(f"[Watchdog] {watchdog.summary()}")
         print("Stopped safely.")
 
 
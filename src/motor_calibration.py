@@ -0,0 +1,144 @@
+# src/motor_calibration.py
+import json
+import os
+import time
+
+# 查表解析度：每 1.0 速度分成幾格（index = round(|speed| * LUT_STEPS)）
+LUT_STEPS = 1000
+
+# PCA9685 計數（12-bit）
+PWM_MAX = 4095
+FULL_ON = (4096, 0)   # ON 暫存器 bit12：全開
+FULL_OFF = (0, 0)
+
+WHEELS = ("left", "right")
+DIRECTIONS = ("fwd", "rev")
+
+
+def duty_to_pwm(duty: float):
+    """duty（0.0 ~ 1.0）→ set_pwm 的 (on, off)，與 PCA9685.duty 相同的換算"""
+    if duty <= 0.0:
+        return FULL_OFF
+    if duty >= 1.0:
+        return FULL_ON
+    return (0, int(duty * PWM_MAX))
+
+
+def legacy_table(min_power: float, steps: int = LUT_STEPS):
+    """
+    未校正時的預設表：與原本 _write_hardware 相同
+    （低於 MIN_POWER 的非零速度補到 MIN_POWER，其餘線性 int(x * 4095)）
+    """
+    return tuple(duty_to_pwm(max(i / steps, min_power)) for i in range(steps + 1))
+
+
+def _interp(x: float, xs, ys) -> float:
+    """一維線性內插（xs 遞增；超出範圍取端點）"""
+    if x <= xs[0]:
+        return ys[0]
+    for i in range(1, len(xs)):
+        if x <= xs[i]:
+            x0, x1 = xs[i - 1], xs[i]
+            t = (x - x0) / (x1 - x0) if x1 > x0 else 1.0
+            return ys[i - 1] + t * (ys[i] - ys[i - 1])
+    return ys[-1]
+
+
+def build_tables(points: dict, steps: int = LUT_STEPS):
+    """
+    由量測點建出每輪、每方向的查表
+    :param points: {"left": {"fwd": [[duty, rps], ...], "rev": [...]}, "right": {...}}
+                   每條曲線至少要有起步點（剛開始轉的 duty, 0）與一個以上的量測點
+    :return: {"left": {"fwd": [(on, off), ...], "rev": [...]}, "right": {...}}
+
+    做法：
+    - 四條曲線中「最大轉速最小」的那條決定共同上限 r_max（速度 1.0 = r_max，四條都做得到）
+    - 速度 v → 目標轉速 v * r_max → 反查該曲線得 duty → PCA 計數
+    - 起步死區自然包含在曲線裡（再小的目標轉速也至少給起步 duty）
+    """
+    curves = {}
+    for wheel in WHEELS:
+        for direction in DIRECTIONS:
+            pts = sorted((float(d), float(r)) for d, r in points[wheel][direction])
+            duties, rps = [], []
+            best = 0.0
+            for d, r in pts:
+                # 量測雜訊可能讓曲線不單調：取累積最大值，確保可反查
+                best = max(best, r)
+                duties.append(d)
+                rps.append(best)
+            curves[(wheel, direction)] = (duties, rps)
+
+    r_max = min(rps[-1] for _, rps in curves.values())
+    if r_max <= 0.0:
+        raise ValueError("calibration has a wheel/direction that never moved")
+
+    tables = {wheel: {} for wheel in WHEELS}
+    for (wheel, direction), (duties, rps) in curves.items():
+        # 反查：rps → duty（同一轉速有多個 duty 時取最小，也就是剛達到的那個）
+        inv_r, inv_d = [], []
+        for d, r in zip(duties, rps):
+            if inv_r and r <= inv_r[-1]:
+                continue
+            inv_r.append(r)
+            inv_d.append(d)
+
+        # 起步 duty：曲線上最後一個轉速為 0 的點（沒有則取第一點）
+        start = max((d for d, r in zip(duties, rps) if r <= 0.0), default=duties[0])
+
+        table = [FULL_OFF]
+        for i in range(1, steps + 1):
+            target = (i / steps) * r_max
+            duty = max(start, _interp(target, inv_r, inv_d)) if len(inv_r) > 1 else start
+            table.append(duty_to_pwm(duty))
+        tables[wheel][direction] = table
+
+    return tables
+
+
+def save_calibration(path: str, points: dict, pca_freq: float = None, steps: int = LUT_STEPS) -> dict:
+    """建表並寫入 JSON（量測點與查表一起存，之後可重新建表）"""
+    data = {
+        "version": 1,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "pca_freq": pca_freq,
+        "steps": steps,
+        "points": points,
+        "lut": build_tables(points, steps),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    return data
+
+
+def load_tables(path: str):
+    """
+    讀取校正檔
+    :return: ({"left": (fwd, rev), "right": (fwd, rev)}, steps)，每個表是 (on, off) 的 tuple；
+             檔案不存在或格式不對時回傳 None
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        steps = int(data["steps"])
+        lut = data["lut"]
+        tables = {
+            wheel: tuple(
+                tuple(tuple(entry) for entry in lut[wheel][direction])
+                for direction in DIRECTIONS
+            )
+            for wheel in WHEELS
+        }
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"[Motor] Ignoring calibration {path}: {e}")
+        return None
+
+    for fwd, rev in tables.values():
+        if len(fwd) != steps + 1 or len(rev) != steps + 1:
+            print(f"[Motor] Ignoring calibration {path}: table size mismatch")
+            return None
+
+    return tables, steps
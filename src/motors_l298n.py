@@ -1,5 +1,6 @@
 # src/motors_l298n.py
-from .config import *
+from .motor_calibration import FULL_OFF, FULL_ON, LUT_STEPS, legacy_table, load_tables
+from .runtime_config import CONFIG
 
 
 class L298NMotor:
@@ -14,32 +15,53 @@ class L298NMotor:
     STOP_EPS = 0.05          # 小於此速度視為停止（方向判斷與起步補償都用到）
     MIN_POWER = 0.21         # 起步補償最小推力（只要不是停，就至少給這個 PWM）
 
-    def __init__(self, pca, pwm_pin: int, in1_pin: int, in2_pin: int):
+    def __init__(self, pca, pwm_pin: int, in1_pin: int, in2_pin: int, cfg=None,
+                 lut=None, lut_steps: int = LUT_STEPS):
+        """
+        :param lut: (正轉表, 反轉表)，每格是 set_pwm 的 (on, off)；None 則用 legacy 表
+        :param lut_steps: 查表解析度（index = round(|speed| * lut_steps)）
+        """
         self.pca = pca
+        # 執行期設定（可熱更新）；未指定則使用全域 CONFIG
+        self.cfg = cfg if cfg is not None else CONFIG
         self.pwm_pin = pwm_pin
         self.in1_pin = in1_pin
         self.in2_pin = in2_pin
 
+        # 速度 → PCA 計數的查表（建構時算好，tick 中不做浮點換算）
+        if lut is None:
+            lut = (legacy_table(self.MIN_POWER, lut_steps),) * 2
+        self.lut_fwd, self.lut_rev = lut
+        self.lut_steps = lut_steps
+
         # 目前速度（會被 slew rate 逐步逼近目標）
         self.current_speed = 0.0
 
-    def set_target(self, target_speed: float) -> None:
+    def set_target(self, target_speed: float, dt: float = None) -> None:
         """
         設定目標速度（-1.0 ~ 1.0，實際會限制到 [-0.8, 0.8]）
         功能包含：
-        1) Slew Rate（平滑加減速，避免瞬間跳變）
+        1) Slew Rate（平滑加減速，避免瞬間跳變；SLEW_RATE 單位為「每秒」）
         2) Deadzone / 起步補償（避免 PWM 太小推不動）
+        :param dt: 距上次呼叫的實際時間（秒）；None 則視為理想週期 1/CONTROL_HZ
         """
+        cfg = self.cfg
+
         # --- 0) 限幅：避免速度過大（保留你原本 -0.8~0.8 的限制）---
         target_speed = max(-self.SPEED_LIMIT, min(self.SPEED_LIMIT, target_speed))
 
         # --- 1) Slew Rate 平滑運算 ---
-        # 若 SLEW_RATE > 0：每次呼叫最多只改變 SLEW_RATE，讓速度逐步靠近 target
-        if SLEW_RATE > 0.0:
+        # 若 SLEW_RATE > 0：本次最多只改變 SLEW_RATE * dt，讓速度逐步靠近 target
+        if cfg.SLEW_RATE > 0.0:
+            if dt is None:
+                dt = 1.0 / cfg.CONTROL_HZ
+            dt = max(cfg.DT_MIN, min(cfg.DT_MAX, dt))
+            max_step = cfg.SLEW_RATE * dt
+
             delta = target_speed - self.current_speed
 
-            if abs(delta) > SLEW_RATE:
-                self.current_speed += SLEW_RATE if delta > 0 else -SLEW_RATE
+            if abs(delta) > max_step:
+                self.current_speed += max_step if delta > 0 else -max_step
             else:
                 self.current_speed = target_speed
         else:
@@ -52,38 +74,28 @@ class L298NMotor:
     def _write_hardware(self, speed: float) -> None:
         """
         寫入 PCA9685（方向腳位 + PWM）
-        同時包含「起步補償」：
-        - 馬達在很低 PWM 時可能推不動
-        - 只要不是停止，就至少給 MIN_POWER
+        PWM 計數由預先算好的查表取得（每 tick 只有一次乘法 + 查表）：
+        - 有校正檔：每輪、每方向各自的「速度 → PCA 計數」表（含起步死區、左右輪差異）
+        - 沒有校正檔：legacy 表，等同原本的起步補償（至少 MIN_POWER）+ int(x * 4095)
         """
-        abs_speed = abs(speed)
-
-        # --- 起步補償（保留你原本的邏輯與數值）---
-        # 速度很小 => 當作要停
-        if abs_speed < self.STOP_EPS:
-            final_pwm = 0.0
-        else:
-            # 要動 => PWM 至少 MIN_POWER
-            final_pwm = max(abs_speed, self.MIN_POWER)
-
-        # --- 方向控制 + PWM 輸出 ---
+        # --- 方向控制 + PWM 輸出（方向腳位直接寫 full-on / full-off）---
         if speed > self.STOP_EPS:
             # 正轉：IN1=1, IN2=0
-            self.pca.dig(self.in1_pin, True)
-            self.pca.dig(self.in2_pin, False)
-            self.pca.duty(self.pwm_pin, final_pwm)
+            self.pca.set_pwm(self.in1_pin, *FULL_ON)
+            self.pca.set_pwm(self.in2_pin, *FULL_OFF)
+            self.pca.set_pwm(self.pwm_pin, *self.lut_fwd[int(speed * self.lut_steps + 0.5)])
 
         elif speed < -self.STOP_EPS:
             # 反轉：IN1=0, IN2=1
-            self.pca.dig(self.in1_pin, False)
-            self.pca.dig(self.in2_pin, True)
-            self.pca.duty(self.pwm_pin, final_pwm)
+            self.pca.set_pwm(self.in1_pin, *FULL_OFF)
+            self.pca.set_pwm(self.in2_pin, *FULL_ON)
+            self.pca.set_pwm(self.pwm_pin, *self.lut_rev[int(-speed * self.lut_steps + 0.5)])
 
         else:
             # 停止：IN1=0, IN2=0，PWM=0
-            self.pca.dig(self.in1_pin, False)
-            self.pca.dig(self.in2_pin, False)
-            self.pca.duty(self.pwm_pin, 0.0)
+            self.pca.set_pwm(self.in1_pin, *FULL_OFF)
+            self.pca.set_pwm(self.in2_pin, *FULL_OFF)
+            self.pca.set_pwm(self.pwm_pin, *FULL_OFF)
 
 
 class MotorDriver:
@@ -93,22 +105,42 @@ class MotorDriver:
     - right: 右輪（ENB + IN3/IN4）
     """
 
-    def __init__(self, pca):
+    def __init__(self, pca, cfg=None):
         self.pca = pca
+        cfg = cfg if cfg is not None else CONFIG
+
+        # 馬達校正表（motor_test_l298n.py calibrate 產生）；沒有檔案就用 legacy 表
+        calib = load_tables(cfg.MOTOR_LUT_FILE) if cfg.MOTOR_LUT_FILE else None
+        if calib is not None:
+            tables, steps = calib
+            print(f"[Motor] Using calibration {cfg.MOTOR_LUT_FILE}")
+        else:
+            tables, steps = {"left": None, "right": None}, LUT_STEPS
 
         # 左右輪腳位由 config.py 提供（保留你原本的 mapping）
-        self.left = L298NMotor(pca, PIN_L_ENA, PIN_L_IN1, PIN_L_IN2)
-        self.right = L298NMotor(pca, PIN_R_ENB, PIN_R_IN3, PIN_R_IN4)
+        self.left = L298NMotor(pca, cfg.PIN_L_ENA, cfg.PIN_L_IN1, cfg.PIN_L_IN2, cfg,
+                               tables["left"], steps)
+        self.right = L298NMotor(pca, cfg.PIN_R_ENB, cfg.PIN_R_IN3, cfg.PIN_R_IN4, cfg,
+                                tables["right"], steps)
 
-    def set(self, left_speed: float, right_speed: float) -> None:
+    def set(self, left_speed: float, right_speed: float, dt: float = None) -> None:
         """
         設定左右輪速度（-1.0 ~ 1.0）
         內部會套用各自的 slew rate 與起步補償
+        :param dt: 實際量測的迴圈週期（秒），None 則視為 1/CONTROL_HZ
         """
-        self.left.set_target(left_speed)
-        self.right.set_target(right_speed)
+        self.left.set_target(left_speed, dt)
+        self.right.set_target(right_speed, dt)
 
-    def stop(self) -> None:
+    def stop(self, dt: float = None) -> None:
         """停止左右輪（等同 set(0, 0)）"""
-        self.left.set_target(0.0)
-        self.right.set_target(0.0)
+        self.left.set_target(0.0, dt)
+        self.right.set_target(0.0, dt)
+
+    def reset(self) -> None:
+        """
+        輸出已在外部被切斷（例如看門狗）：slew 狀態歸零，
+        下一次 set() 從靜止重新加速，而不是直接跳回停頓前的速度
+        """
+        self.left.current_speed = 0.0
+        self.right.current_speed = 0.0
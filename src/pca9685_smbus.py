@@ -1,31 +1,65 @@
 # src/pca9685_smbus.py
+import glob
+import json
+import os
+import platform
+import queue
+import re
+import threading
 import time
 from smbus2 import SMBus
 
+from .i2c_transport import I2CTransport
+
+# find_pca_bus 的快取檔（依板子型號分開記錄）
+BUS_CACHE_PATH = os.path.expanduser("~/.cache/line_follower/pca_bus.json")
+
 
 class PCA9685:
     """
     PCA9685：16 通道 PWM 控制器（I2C 介面）
     - 使用 smbus2 操作 I2C
     - 提供 set_pwm / duty / dig / set_frequency / stop_all 等常用功能
+    - 暫存器讀寫經過 I2CTransport（重試額度、每 tick 期限、錯誤後補寫、統計）
     """
 
     # ===== PCA9685 重要暫存器位址 =====
     MODE1 = 0x00 # MODE1 暫存器（位址 0x00）
+    ALLCALLADR = 0x05 # LED All Call 位址暫存器（上電預設 0xE0，用來確認是 PCA9685）
     PRESCALE = 0xFE # PRESCALE 暫存器（位址 0xFE）
     LED0_ON_L = 0x06  # PWM 通道 0 的 ON_L 起始位址（每個通道占 4 bytes）
+    ALL_LED_ON_L = 0xFA  # 全通道 ON_L（ALL_LED_ON_L/H、ALL_LED_OFF_L/H 共 4 bytes）
+
+    # ===== MODE1 位元 =====
+    MODE1_SLEEP = 0x10    # 低功耗（振盪器關閉，PWM 停止）
+    MODE1_RESTART = 0x80  # 從 sleep 回來後重新啟動 PWM
 
-    def __init__(self, bus_num: int = 7, address: int = 0x40):
+    def __init__(self, bus_num: int = 7, address: int = 0x40, warm_start: bool = False,
+                 bus=None, retries: int = 2, tick_retry_budget: int = 8,
+                 tick_deadline: float = 0.015):
         """
         初始化 PCA9685
         :param bus_num: I2C bus 編號（Jetson / Linux 可能是 1、7... 依實機而定）
         :param address: PCA9685 I2C 位址（常見為 0x40）
+        :param warm_start: True 時先讀 MODE1；晶片已醒著（上次程式留下的狀態）
+                           就跳過 reset + 10ms 等待，並用 ALL_LED 暫存器 4 次寫入全停
+        :param bus: 已開啟的 SMBus 相容物件（測試 / 模擬可傳 FakeSMBus）；None 則開啟 bus_num
+        :param retries, tick_retry_budget, tick_deadline: 見 I2CTransport
         """
         self.bus_num = bus_num
         self.address = address
 
         print(f"PCA9685 Init: Opening Bus {bus_num} at address {hex(address)}")
-        self.bus = SMBus(bus_num)
+        self.bus = bus if bus is not None else SMBus(bus_num)
+        self.io = I2CTransport(self.bus, address, retries, tick_retry_budget, tick_deadline)
+
+        # 暖啟動：晶片醒著就不需要 reset
+        self.warm = warm_start and not (self.read8(self.MODE1) & self.MODE1_SLEEP)
+
+        if self.warm:
+            # 全停（安全起見）：ALL_LED 一次關掉 16 個通道
+            self.all_off()
+            return
 
         # 1) Reset：寫 MODE1=0x00，回到一般模式（也等同關掉 sleep）
         self.write8(self.MODE1, 0x00)
@@ -35,28 +69,35 @@ class PCA9685:
         self.stop_all()
 
     # ===== 基本 I2C 讀寫 =====
-    def write8(self, reg: int, val: int) -> None:
+    def write8(self, reg: int, val: int) -> bool:
         """
         寫入單一 byte 到指定暫存器
         :param reg: 暫存器位址
         :param val: 要寫入的值（只取低 8 bits）
+        :return: 是否成功；失敗的暫存器會在下一個 begin_tick() 依 shadow 補寫
         """
-        try:
-            self.bus.write_byte_data(self.address, reg, val & 0xFF) # I2C 寫入：將 val 取低 8 位元後，寫入指定裝置的暫存器 reg。
-        except Exception as e:
-            print(f"I2C Error (write8): {e}")
+        return self.io.write8(reg, val)
 
     def read8(self, reg: int) -> int:
         """
         讀取指定暫存器的單一 byte
         :param reg: 暫存器位址
-        :return: 讀到的值；若失敗回傳 0
+        :return: 讀到的值；失敗時丟出 I2CError（不再回傳 0，避免 set_frequency 用錯的 MODE1）
         """
-        try:
-            return self.bus.read_byte_data(self.address, reg)
-        except Exception as e:
-            print(f"I2C Error (read8): {e}")
-            return 0
+        return self.io.read8(reg)
+
+    def begin_tick(self) -> None:
+        """控制迴圈每個 tick 輸出前呼叫：重設 I2C 重試額度 / 期限並補寫失敗的暫存器"""
+        self.io.begin_tick()
+
+    def end_tick(self) -> None:
+        """tick 輸出結束：之後（例如清理停車）的寫入不受 tick 期限限制"""
+        self.io.end_tick()
+
+    @property
+    def stats(self):
+        """I2C 匯流排統計（BusStats）"""
+        return self.io.stats
 
     # ===== PWM 設定 =====
     def _channel_base_reg(self, ch: int) -> int:
@@ -71,9 +112,17 @@ class PCA9685:
         設定單一通道 PWM 的 ON / OFF 計數值（0~4096）
         【保留原本關鍵行為】：
         - 分 4 次 write8 寫入（不使用 write_i2c_block_data）
+        超過本 tick 的 I2C 期限時，整個通道延後到下一個 tick 再寫（不會只寫一半）
         """
         base = self._channel_base_reg(ch)
 
+        if self.io.expired():
+            self.io.defer(base + 0, on & 0xFF)
+            self.io.defer(base + 1, (on >> 8) & 0xFF)
+            self.io.defer(base + 2, off & 0xFF)
+            self.io.defer(base + 3, (off >> 8) & 0xFF)
+            return
+
         # ON LOW / HIGH
         self.write8(base + 0, on & 0xFF)
         self.write8(base + 1, (on >> 8) & 0xFF)
@@ -111,16 +160,29 @@ class PCA9685:
         self.duty(ch, 1.0 if high else 0.0)
 
     # ===== 頻率設定 =====
-    def set_frequency(self, freq_hz: float) -> None:
+    @staticmethod
+    def prescale_for(freq_hz: float) -> int:
+        """prescale = round(25e6 / (4096 * freq)) - 1（PCA9685 內部時鐘 25MHz）"""
+        return int(round(25000000.0 / (4096.0 * freq_hz)) - 1)
+
+    def set_frequency(self, freq_hz: float, skip_if_set: bool = False) -> bool:
         """
         設定 PCA9685 PWM 頻率（Hz）
         - PCA9685 內部時鐘 25MHz（標準值）
         - prescale = round(25e6 / (4096 * freq)) - 1
+        :param skip_if_set: True 時先讀 PRESCALE / MODE1，已是目標頻率且晶片醒著就跳過
+                            （省下 sleep → 寫 prescale → restart 與 5ms 等待）
+        :return: 是否真的重新寫入了 prescale
         """
-        prescale = int(round(25000000.0 / (4096.0 * freq_hz)) - 1)
+        prescale = self.prescale_for(freq_hz)
 
         # 先把晶片切到 sleep 才能安全寫 prescale
         old_mode1 = self.read8(self.MODE1)
+
+        if skip_if_set and not (old_mode1 & self.MODE1_SLEEP):
+            if self.read8(self.PRESCALE) == prescale:
+                return False
+
         mode1_sleep = (old_mode1 & 0x7F) | 0x10  # 0x10 = SLEEP bit
 
         self.write8(self.MODE1, mode1_sleep)
@@ -131,7 +193,8 @@ class PCA9685:
         time.sleep(0.005)
 
         # 重啟（RESTART bit）
-        self.write8(self.MODE1, old_mode1 | 0x80)
+        self.write8(self.MODE1, old_mode1 | self.MODE1_RESTART)
+        return True
 
     # ===== 安全停車 =====
     def stop_all(self) -> None:
@@ -139,4 +202,159 @@ class PCA9685:
         將 16 個通道全部設為 0% duty（全停）
         """
         for ch in range(16):
-            self.duty(ch, 0.0)
\ No newline at end of file
+            self.duty(ch, 0.0)
+
+    def all_off(self) -> None:
+        """
+        與 stop_all 結果相同（16 通道 ON=0 / OFF=0），
+        但透過 ALL_LED 暫存器只需 4 次寫入（stop_all 需要 64 次）
+        """
+        # ALL_LED 是廣播暫存器：直接寫 bus，不進 shadow / dirty。
+        # 若失敗後留在 dirty，下個 begin_tick() 的 re-sync 會把它再廣播一次，
+        # 蓋掉之後才寫好的通道（馬達 PWM 被改掉）；失敗就改用逐通道的 stop_all()
+        try:
+            for i in range(4):
+                self.bus.write_byte_data(self.address, self.ALL_LED_ON_L + i, 0x00)
+        except OSError as e:
+            print(f"[I2C] ALL_LED write failed ({e}); stopping channels one by one")
+            self.stop_all()
+            return
+
+        # ALL_LED 會同時改掉每個通道的暫存器：同步 shadow，
+        # 避免之後 re-sync 把舊的（可能是轉動中的）值寫回去
+        for reg in range(self.LED0_ON_L, self.LED0_ON_L + 4 * 16):
+            self.io.shadow[reg] = 0x00
+            self.io.dirty.discard(reg)
+
+
+# ===== Bus 自動偵測 =====
+def board_identity() -> str:
+    """
+    板子識別字串（快取的 key）：device-tree model（Jetson / Pi）→ DMI product name → hostname
+    """
+    for path in (
+        "/proc/device-tree/model",
+        "/sys/firmware/devicetree/base/model",
+        "/sys/class/dmi/id/product_name",
+    ):
+        try:
+            with open(path, "rb") as f:
+                model = f.read().replace(b"\x00", b"").decode("utf-8", "replace").strip()
+        except OSError:
+            continue
+        if model:
+            return model
+    return platform.node() or "unknown"
+
+
+def list_i2c_buses():
+    """列出 /dev/i2c-* 的 bus 編號（由小到大）"""
+    nums = []
+    for path in glob.glob("/dev/i2c-*"):
+        m = re.match(r".*/i2c-(\d+)$", path)
+        if m:
+            nums.append(int(m.group(1)))
+    return sorted(nums)
+
+
+def probe_pca(bus_num: int, address: int = 0x40, bus_factory=SMBus) -> bool:
+    """
+    確認 bus_num 上的 address 是 PCA9685：
+    - 讀得到 MODE1
+    - PRESCALE >= 3（晶片硬體限制的最小值）
+    - ALLCALLADR == 0xE0（上電預設值，可排除同位址的其他晶片，例如 INA3221）
+    """
+    try:
+        with bus_factory(bus_num) as bus:
+            bus.read_byte_data(address, PCA9685.MODE1)
+            prescale = bus.read_byte_data(address, PCA9685.PRESCALE)
+            allcall = bus.read_byte_data(address, PCA9685.ALLCALLADR)
+    except OSError:
+        return False
+    return prescale >= 3 and allcall == 0xE0
+
+
+def _load_bus_cache(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_bus_cache(path: str, data: dict) -> None:
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[I2C] Could not write bus cache {path}: {e}")
+
+
+def find_pca_bus(address: int = 0x40, cache_path: str = BUS_CACHE_PATH,
+                 bus_factory=SMBus, bus_nums=None, timeout: float = 1.0):
+    """
+    找出 PCA9685 所在的 I2C bus
+    1) 先查快取（key = 板子型號 + 位址），快取的 bus 驗證成功就直接回傳（只需 3 次讀取）
+    2) 否則同時掃描所有 /dev/i2c-*（每條 bus 一個執行緒，最多等 timeout 秒），
+       快取的 bus 也一起再試一次（偶發的讀取錯誤不會讓它被排除）；
+       多條都有回應時優先取快取的 bus，否則取編號最小的，並寫回快取
+    :param bus_factory: 開啟 bus 的函式（測試可傳 FakeSMBus）
+    :param bus_nums: 要掃描的 bus 編號；None 則列出 /dev/i2c-*
+    :param cache_path: 快取檔路徑；None 則不使用快取
+    :return: bus 編號；找不到則回傳 None
+    """
+    identity = board_identity()
+    key = f"{identity}@{hex(address)}"
+
+    # --- 1) 快取 ---
+    cache = _load_bus_cache(cache_path) if cache_path else {}
+    cached = cache.get(key)
+    if isinstance(cached, int) and probe_pca(cached, address, bus_factory):
+        print(f"[I2C] PCA9685 at bus {cached} (cached for {identity})")
+        return cached
+
+    # --- 2) 並行掃描 ---
+    if bus_nums is None:
+        bus_nums = list_i2c_buses()
+    bus_nums = list(bus_nums)
+    if isinstance(cached, int) and cached not in bus_nums:
+        bus_nums.append(cached)
+
+    results = queue.Queue()
+    for n in bus_nums:
+        # daemon：某條 bus 卡住時不會拖住整個程式結束
+        threading.Thread(
+            target=lambda n=n: results.put((n, probe_pca(n, address, bus_factory))),
+            name=f"i2c-probe-{n}",
+            daemon=True,
+        ).start()
+
+    found = []
+    deadline = time.monotonic() + timeout
+    for _ in bus_nums:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            n, ok = results.get(timeout=remaining)
+        except queue.Empty:
+            break
+        if ok:
+            found.append(n)
+
+    if not found:
+        print(f"[I2C] No PCA9685 at {hex(address)} on buses {bus_nums}")
+        return None
+
+    bus_num = cached if cached in found else min(found)
+    print(f"[I2C] PCA9685 at bus {bus_num} (scanned {len(bus_nums)} buses)")
+
+    if cache_path:
+        cache[key] = bus_num
+        _save_bus_cache(cache_path, cache)
+
+    return bus_num
@@ -0,0 +1,71 @@
+# src/pilot.py
+from .controller_pd import PDController
+from .recovery import LineRecovery
+from .runtime_config import CONFIG
+from .speed_schedule import SpeedScheduler
+
+
+class Pilot:
+    """
+    每個 tick 的決策：Vision 的 error / confidence → 左右輪命令
+    - 掉線恢復（LineRecovery）：TRACKING / COAST / SEARCH / STOPPED
+    - TRACKING 時：速度排程（SPEED_SCHEDULE）+ PD 控制
+    main() 與模擬器共用同一份邏輯，模擬結果才代表實車行為
+    """
+
+    def __init__(self, cfg=None):
+        self.cfg = cfg if cfg is not None else CONFIG
+
+        self.controller = PDController(self.cfg)
+        self.scheduler = SpeedScheduler(self.cfg)
+        self.recovery = LineRecovery(self.cfg)
+
+    def on_config_change(self, changed) -> None:
+        """設定熱更新後呼叫（changed：有改變的 key）"""
+        if "SPEED_SCHEDULE" in changed or "SPEED_WINDOW" in changed:
+            # 排程開關 / 視窗長度改變：速度排程從低速重新開始
+            self.scheduler.reset()
+
+    def step(self, error: float, conf: float, now: float, dt: float):
+        """
+        :param error, conf: Vision.process 的輸出
+        :param now: 目前時間（monotonic 秒；模擬器傳模擬時間）
+        :param dt: 實際迴圈週期（秒）
+        :return: (state, speed, left_cmd, right_cmd)
+        """
+        cfg = self.cfg
+        recovery = self.recovery
+
+        # conf 太低視為「找不到線」：交給掉線恢復狀態機
+        # （先沿最後方向滑行 → 往最後 error 方向搜尋 → 逾時才停車）
+        prev_state = recovery.state
+        state = recovery.update(conf, now)
+
+        if state == LineRecovery.TRACKING:
+            if prev_state in (LineRecovery.SEARCH, LineRecovery.STOPPED):
+                # 搜尋時轉過方向 / 停過車：清掉 D 項歷史，速度重新從低速排程
+                self.controller.reset()
+                self.scheduler.reset()
+
+            if cfg.SPEED_SCHEDULE:
+                # 速度排程：直線加速、彎道減速，KP/KD 依速度內插
+                speed, kp, kd = self.scheduler.update(error, conf, dt)
+            else:
+                speed, kp, kd = cfg.BASE_SPEED, cfg.KP, cfg.KD
+
+            # PD 控制器輸出左右輪命令
+            left_cmd, right_cmd = self.controller.step(error, dt, speed, kp, kd)
+            recovery.remember(error, left_cmd, right_cmd)
+            return state, speed, left_cmd, right_cmd
+
+        if state == LineRecovery.COAST:
+            # 短暫遮擋 / 反光：維持最後的命令，不減速
+            return state, 0.0, *recovery.last_cmd
+
+        if state == LineRecovery.SEARCH:
+            # 往最後已知 error 的方向轉
+            speed = cfg.SEARCH_SPEED
+            return (state, speed, *self.controller.mix(speed, recovery.search_steer()))
+
+        # 搜尋逾時：停車等線出現
+        return state, 0.0, 0.0, 0.0
@@ -0,0 +1,202 @@
+# src/profiler.py
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+from .runtime_config import CONFIG
+
+
+class SamplingProfiler:
+    """
+    執行中取樣的 profiler（不用停車）
+    - 輔助執行緒以 PROFILE_HZ 讀取主執行緒的 stack（sys._current_frames），累計相同 stack 的次數
+    - 停止時寫出 collapsed stack（每行 "a;b;c 次數"，可直接給 flamegraph.pl / speedscope）
+    - 開銷上限：每次取樣的耗時超過 PROFILE_MAX_OVERHEAD * 取樣間隔時自動拉長間隔，
+      結束時回報實際取樣率與開銷比例
+    - install_signals()：SIGUSR1 開始、SIGUSR2 停止並寫檔
+      （handler 只設定旗標；開始 / 停止與 print 都在控制執行緒做，不會在主迴圈 print 到一半時重入 stdout）
+        kill -USR1 $(pgrep -f src.main)   # 開始
+        kill -USR2 $(pgrep -f src.main)   # 停止 → PROFILE_DIR/profile-*.folded
+    限制：取樣需要 GIL；主執行緒在不釋放 GIL 的 C 函式裡時，樣本會延後到它結束
+    （cv2 / I2C ioctl 會釋放 GIL，這兩條路徑可以正常取樣）
+    """
+
+    def __init__(self, thread_id: int = None, cfg=None):
+        """
+        :param thread_id: 要取樣的執行緒；None 則為建立 profiler 的執行緒（通常是主執行緒）
+        """
+        self.cfg = cfg if cfg is not None else CONFIG
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+
+        self._stop = threading.Event()
+        self._thread = None
+
+        # signal handler → 控制執行緒：要求的狀態（True = 取樣）與通知
+        self._want = False
+        self._request = threading.Event()
+        self._control = None
+        self._labels = {}
+
+        self.stacks = Counter()
+        self.samples = 0
+        self.sample_time = 0.0
+        self.elapsed = 0.0
+        self.last_path = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ===== 開始 / 停止 =====
+    def start(self) -> bool:
+        """開始取樣；已在執行中則不動作"""
+        if self.running:
+            return False
+
+        self.stacks = Counter()
+        self.samples = 0
+        self.sample_time = 0.0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        print(f"[Profiler] Sampling at {self.cfg.PROFILE_HZ} Hz")
+        return True
+
+    def stop(self, wait: bool = True) -> None:
+        """
+        停止取樣；寫檔在輔助執行緒裡做
+        :param wait: 是否等到檔案寫完
+        """
+        if not self.running:
+            return
+        self._stop.set()
+        if wait:
+            self._thread.join(timeout=5.0)
+
+    def install_signals(self) -> bool:
+        """SIGUSR1 → start()，SIGUSR2 → stop()（只能在主執行緒呼叫；非 POSIX 回傳 False）"""
+        if not hasattr(signal, "SIGUSR1"):
+            return False
+
+        if self._control is None:
+            self._control = threading.Thread(target=self._control_loop, name="profiler-ctl", daemon=True)
+            self._control.start()
+        signal.signal(signal.SIGUSR1, lambda *_: self._signal(True))
+        signal.signal(signal.SIGUSR2, lambda *_: self._signal(False))
+        return True
+
+    def _signal(self, want: bool) -> None:
+        # signal handler 在主執行緒、任何一行之間執行：這裡不 print、不開執行緒，只設旗標
+        self._want = want
+        self._request.set()
+
+    def _control_loop(self) -> None:
+        while True:
+            self._request.wait()
+            self._request.clear()
+            if self._want:
+                self.start()
+            else:
+                self.stop()
+
+    # ===== 取樣 =====
+    def _label(self, code) -> str:
+        """frame 的名稱（依 code object 快取）：'process (src/vision_line.py:21)'"""
+        label = self._labels.get(code)
+        if label is None:
+            path = code.co_filename.replace("\\", "/").split("/")
+            label = f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+            # collapsed 格式以 ';' 分隔 frame（次數接在最後一個空白之後，名稱中的空白不影響）
+            label = label.replace(";", ":")
+            self._labels[code] = label
+        return label
+
+    def sample(self) -> bool:
+        """取一次樣；目標執行緒不存在時回傳 False"""
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return False
+
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        self.stacks[";".join(stack)] += 1
+        self.samples += 1
+        return True
+
+    def _run(self) -> None:
+        cfg = self.cfg
+        interval = 1.0 / cfg.PROFILE_HZ
+        start = time.perf_counter()
+
+        while not self._stop.wait(interval):
+            t0 = time.perf_counter()
+            alive = self.sample()
+            cost = time.perf_counter() - t0
+            self.sample_time += cost
+            if not alive:
+                break
+
+            # 開銷上限：取樣耗時不可超過間隔的 PROFILE_MAX_OVERHEAD
+            interval = max(1.0 / cfg.PROFILE_HZ, cost / cfg.PROFILE_MAX_OVERHEAD)
+
+        self.elapsed = time.perf_counter() - start
+        self._write()
+
+    def _write(self) -> None:
+        if not self.samples:
+            print("[Profiler] No samples")
+            return
+
+        out_dir = self.cfg.PROFILE_DIR
+        path = os.path.join(out_dir, time.strftime("profile-%Y%m%d-%H%M%S.folded"))
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in self.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            print(f"[Profiler] Could not write {path}: {e}")
+            return
+
+        self.last_path = path
+        print(f"[Profiler] Wrote {path}: {self.summary()}")
+
+    def summary(self) -> str:
+        rate = self.samples / self.elapsed if self.elapsed > 0 else 0.0
+        overhead = self.sample_time / self.elapsed * 100 if self.elapsed > 0 else 0.0
+        return (
+            f"{self.samples} samples in {self.elapsed:.1f} s ({rate:.0f} Hz), "
+            f"overhead {overhead:.2f}%"
+        )
+
+
+def _run_profiler_test():
+    """
+    測試模式：取樣一段 busy loop 2 秒並寫檔
+    """
+    def busy(n):
+        return sum(i * i for i in range(n))
+
+    profiler = SamplingProfiler()
+    profiler.start()
+    deadline = time.monotonic() + 2.0
+    while time.monotonic() < deadline:
+        busy(200000)
+        time.sleep(0.002)
+    profiler.stop()
+
+    if profiler.last_path:
+        with open(profiler.last_path, encoding="utf-8") as f:
+            for line in f.readlines()[:5]:
+                print("  " + line.rstrip())
+
+
+if __name__ == "__main__":
+    # 測試指令：python3 -m src.profiler
+    _run_profiler_test()
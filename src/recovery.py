@@ -0,0 +1,83 @@
+# src/recovery.py
+from .runtime_config import CONFIG
+
+
+class LineRecovery:
+    """
+    掉線恢復狀態機（取代「一掉線就停車」）
+
+    TRACKING ──掉線──▶ COAST ──LOST_COAST_TIME──▶ SEARCH ──LOST_SEARCH_TIME──▶ STOPPED
+        ▲                │                          │                          │
+        └────────────────┴──────── 重新看到線 ───────┴──────────────────────────┘
+
+    - COAST：沿用最後一次的左右輪命令（短暫反光 / 遮擋時不減速）
+    - SEARCH：往最後已知 error 的方向轉，找回線條
+    - STOPPED：搜尋逾時，停車等待
+    每次狀態轉換都會印出一行紀錄（不會每個 tick 都印）
+    """
+
+    TRACKING = "TRACKING"
+    COAST = "COAST"
+    SEARCH = "SEARCH"
+    STOPPED = "STOPPED"
+
+    def __init__(self, cfg=None):
+        # 執行期設定（可熱更新）；未指定則使用全域 CONFIG
+        self.cfg = cfg if cfg is not None else CONFIG
+
+        self.state = self.TRACKING
+
+        # 掉線開始時間（monotonic 秒）
+        self.lost_since = None
+
+        # 最後一次「有看到線」時的 error 與左右輪命令
+        self.last_error = 0.0
+        self.last_cmd = (0.0, 0.0)
+
+    def remember(self, error: float, left_cmd: float, right_cmd: float) -> None:
+        """TRACKING 時由主迴圈呼叫，記住最後的 error 與馬達命令"""
+        self.last_error = error
+        self.last_cmd = (left_cmd, right_cmd)
+
+    def search_steer(self) -> float:
+        """SEARCH 模式的轉向量：往最後已知 error 的那一側轉"""
+        cfg = self.cfg
+        return cfg.SEARCH_STEER if self.last_error >= 0.0 else -cfg.SEARCH_STEER
+
+    def update(self, conf: float, now: float) -> str:
+        """
+        依本次 confidence 更新狀態
+        :param conf: Vision 的 confidence
+        :param now: 目前時間（time.monotonic()）
+        :return: 更新後的狀態
+        """
+        cfg = self.cfg
+
+        if conf >= cfg.MIN_CONFIDENCE:
+            self.lost_since = None
+            self._transition(self.TRACKING, conf)
+            return self.state
+
+        if self.lost_since is None:
+            self.lost_since = now
+
+        lost_for = now - self.lost_since
+        if lost_for < cfg.LOST_COAST_TIME:
+            self._transition(self.COAST, conf)
+        elif lost_for < cfg.LOST_COAST_TIME + cfg.LOST_SEARCH_TIME:
+            self._transition(self.SEARCH, conf)
+        else:
+            self._transition(self.STOPPED, conf)
+
+        return self.state
+
+    def _transition(self, new_state: str, conf: float) -> None:
+        """切換狀態（只有真的改變時才印紀錄）"""
+        if new_state == self.state:
+            return
+
+        print(
+            f"[Recovery] {self.state} -> {new_state} "
+            f"(Conf: {conf:.2f}, last Err: {self.last_error:+.2f})"
+        )
+        self.state = new_state
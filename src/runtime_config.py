@@ -0,0 +1,334 @@
+# src/runtime_config.py
+import json
+import math
+import os
+import socket
+import threading
+import types
+
+from . import config as _defaults
+
+
+class RuntimeConfig:
+    """
+    可熱更新的執行期設定（取代各模組 import 時就固定的 config 常數）
+    - 初始值來自 config.py 的大寫常數
+    - 變更來源：JSON 檔（CONFIG_FILE，偵測 mtime）或本機 UDP（127.0.0.1:CONFIG_PORT）
+    - 變更先進 pending，主迴圈在 tick 邊界呼叫 apply_pending() 時一次整批套用
+      -> 同一個 tick 內讀到的值一定是同一版設定
+    - 用法：cfg.KP、cfg.THRESH_VAL ...（與 config.py 同名）
+
+    UDP 範例：
+      echo '{"KP": 0.25, "THRESH_VAL": 90}' | nc -u -w1 127.0.0.1 8765
+    """
+
+    # 需要重新初始化硬體才會生效的設定，不接受熱更新
+    RESTART_ONLY = frozenset({
+        "CAM_INDEX", "CAM_WIDTH", "CAM_HEIGHT", "CAM_FPS",
+        "CAM_WARMUP_TIMEOUT", "CAM_FOURCC", "CAM_MEASURE_FRAMES",
+        "PCA_ADDR", "PCA_FREQ", "I2C_BUS", "WARM_START", "WATCHDOG_TIMEOUT",
+        "I2C_RETRIES", "I2C_TICK_RETRY_BUDGET", "I2C_TICK_DEADLINE",
+        "PIN_L_ENA", "PIN_L_IN1", "PIN_L_IN2",
+        "PIN_R_ENB", "PIN_R_IN3", "PIN_R_IN4", "MOTOR_LUT_FILE",
+        "CONFIG_FILE", "CONFIG_PORT", "TELEMETRY_PORT", "TELEMETRY_QUEUE",
+    })
+
+    # 數值範圍（含端點；None = 不限）：熱更新送進 0 / 負數時在 stage 就擋下，不讓主迴圈除以 0
+    RANGES = {
+        "THRESH_VAL": (0, 255),
+        "ROI_Y_START_RATIO": (0.0, 1.0),
+        "ROI_Y_END_RATIO": (0.0, 1.0),
+        "CC_MIN_AREA": (0.0, 1.0),
+        "MIN_CONFIDENCE": (0.0, 1.0),
+        "BASE_SPEED": (0.0, 1.0),
+        "STEER_LIMIT": (0.0, 1.0),
+        "SEARCH_SPEED": (0.0, 1.0),
+        "SEARCH_STEER": (0.0, 1.0),
+        "SPEED_MIN": (0.0, 1.0),
+        "SPEED_MAX": (0.0, 1.0),
+        "TELEMETRY_JPEG_QUALITY": (0, 100),
+        "KP": (0.0, None),
+        "KD": (0.0, None),
+        "SLEW_RATE": (0.0, None),
+        "D_FILTER_TAU": (0.0, None),
+        "LOST_COAST_TIME": (0.0, None),
+        "LOST_SEARCH_TIME": (0.0, None),
+        "SPEED_RAMP_UP": (0.0, None),
+        "SPEED_RAMP_DOWN": (0.0, None),
+        "CC_POS_WEIGHT": (0.0, None),
+        "CC_HEADING_WEIGHT": (0.0, None),
+        "FRAME_REUSE_MAD": (0.0, None),
+        "FRAME_REUSE_MAX_AGE": (0, None),
+    }
+
+    # 必須 > 0 的設定（頻率、週期、除數）
+    POSITIVE = frozenset({
+        "CONTROL_HZ", "DT_MIN", "DT_MAX", "SPEED_WINDOW",
+        "SPEED_ERR_VAR_MAX", "SPEED_ERR_ABS_MAX", "SPEED_ERR_RATE_MAX", "SPEED_CONF_FULL",
+        "CC_SCALE", "CC_MAX_CANDIDATES", "BIRDSEYE_HALF_WIDTH",
+        "TELEMETRY_FRAME_HZ", "PROFILE_HZ", "PROFILE_MAX_OVERHEAD",
+    })
+
+    # 只能是固定幾個值的字串設定
+    CHOICES = {
+        "BIRDSEYE": ("off", "points", "remap"),
+    }
+
+    def __init__(self, overrides: dict = None):
+        """
+        :param overrides: 初始覆寫值（例如模擬器 / 自動調參用），會經過相同的檢查；
+                          不合法時丟 ValueError
+        """
+        values = {k: getattr(_defaults, k) for k in dir(_defaults) if k.isupper()}
+
+        if overrides:
+            for key, value in overrides.items():
+                values[key] = self._coerce(key, value, values)
+
+            errors = self._validate(values, overrides)
+            if errors:
+                raise ValueError("; ".join(errors))
+
+        # 目前生效的設定（整個物件一次替換，讀取端不需加鎖）
+        self.current = types.SimpleNamespace(**values)
+        self.version = 0
+
+        # 尚未套用的變更（背景執行緒寫入，主迴圈讀出）
+        self._pending = {}
+        self._lock = threading.Lock()
+
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def __getattr__(self, name):
+        # 只有在一般屬性找不到時才會進來 -> 轉交目前的設定
+        if name.isupper():
+            return getattr(self.current, name)
+        raise AttributeError(name)
+
+    def as_dict(self) -> dict:
+        """目前設定的複本"""
+        return dict(vars(self.current))
+
+    # ===== 檢查 / 型別轉換 =====
+    def _coerce(self, key: str, value, base: dict):
+        """
+        依原本的型別轉換輸入值；不合法時丟 ValueError
+        """
+        if key not in base:
+            raise ValueError(f"unknown key {key}")
+
+        old = base[key]
+        if isinstance(old, bool):
+            if isinstance(value, str):
+                return value.strip().lower() in ("1", "true", "yes", "on")
+            return bool(value)
+        if isinstance(old, int) and not isinstance(value, bool):
+            if isinstance(value, float) and not value.is_integer():
+                raise ValueError(f"{key} expects int, got {value!r}")
+            return int(value)
+        if isinstance(old, float):
+            return float(value)
+        if isinstance(old, tuple):
+            # JSON 只有 list：轉回 tuple（GAIN_TABLE 這類巢狀表格一併轉）
+            return tuple(tuple(v) if isinstance(v, list) else v for v in value)
+        if old is None or isinstance(value, type(old)):
+            return value
+        raise ValueError(f"{key} expects {type(old).__name__}, got {value!r}")
+
+    def _validate(self, values: dict, keys) -> list:
+        """
+        檢查範圍與設定之間的關係
+        :param values: 套用後的完整設定
+        :param keys: 這次有改的 key（只檢查這些 key 的範圍；關聯檢查一律做）
+        :return: 錯誤訊息 list（空 = 合法）
+        """
+        errors = []
+
+        for key in keys:
+            value = values[key]
+            # json 接受 NaN / Infinity；NaN 與任何數比較都是 False，範圍檢查擋不住，先排除
+            if isinstance(value, float) and not math.isfinite(value):
+                errors.append(f"{key} must be finite, got {value!r}")
+                continue
+            if key in self.POSITIVE and not value > 0:
+                errors.append(f"{key} must be > 0, got {value!r}")
+            if key in self.RANGES:
+                lo, hi = self.RANGES[key]
+                if (lo is not None and value < lo) or (hi is not None and value > hi):
+                    errors.append(f"{key} must be within [{lo}, {hi if hi is not None else 'inf'}], got {value!r}")
+            if key in self.CHOICES and value not in self.CHOICES[key]:
+                errors.append(f"{key} must be one of {self.CHOICES[key]}, got {value!r}")
+
+        if values["DT_MIN"] > values["DT_MAX"]:
+            errors.append("DT_MIN must be <= DT_MAX")
+        if values["ROI_Y_START_RATIO"] >= values["ROI_Y_END_RATIO"]:
+            errors.append("ROI_Y_START_RATIO must be < ROI_Y_END_RATIO")
+        if values["SPEED_MIN"] > values["SPEED_MAX"]:
+            errors.append("SPEED_MIN must be <= SPEED_MAX")
+
+        # GAIN_TABLE：非空、每列 (speed, kp, kd) 三個數字、speed 嚴格遞增、增益不為負
+        table = values["GAIN_TABLE"]
+        try:
+            rows = [tuple(float(v) for v in row) for row in table]
+        except (TypeError, ValueError):
+            rows = None
+        if not rows or any(len(row) != 3 for row in rows):
+            errors.append("GAIN_TABLE must be a non-empty list of (speed, kp, kd)")
+        elif not all(math.isfinite(v) for row in rows for v in row):
+            errors.append("GAIN_TABLE values must be finite")
+        elif any(b[0] <= a[0] for a, b in zip(rows, rows[1:])):
+            errors.append("GAIN_TABLE must be sorted by strictly increasing speed")
+        elif any(kp < 0 or kd < 0 for _, kp, kd in rows):
+            errors.append("GAIN_TABLE gains must be >= 0")
+
+        return errors
+
+    def stage(self, updates: dict, source: str = "api"):
+        """
+        檢查並暫存一批變更（下一個 tick 邊界才會生效）
+        :return: (accepted_keys, errors)
+        """
+        base = vars(self.current)
+        staged = {}
+        errors = []
+
+        for key, value in updates.items():
+            if key in self.RESTART_ONLY:
+                errors.append(f"{key} needs a restart")
+                continue
+            try:
+                staged[key] = self._coerce(key, value, base)
+            except (TypeError, ValueError) as e:
+                errors.append(f"{key}: {e}")
+
+        # 範圍 / 關聯檢查：以「目前設定 + 尚未套用的變更 + 這一批」為準
+        if not errors:
+            with self._lock:
+                merged = {**base, **self._pending, **staged}
+            errors = self._validate(merged, staged)
+
+        # 一批之中只要有錯就整批不收，避免只套到一半的組合
+        if errors:
+            print(f"[Config] Rejected update from {source}: {'; '.join(errors)}")
+            return [], errors
+
+        with self._lock:
+            self._pending.update(staged)
+        return sorted(staged), []
+
+    def apply_pending(self) -> list:
+        """
+        在 tick 邊界由主迴圈呼叫：把 pending 一次套用（整個 namespace 替換）
+        :return: 有改變的 key（沒有變更時為空 list）
+        """
+        if not self._pending:
+            return []
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        values = dict(vars(self.current))
+        changed = [k for k, v in pending.items() if values.get(k) != v]
+        if not changed:
+            return []
+
+        values.update(pending)
+        self.current = types.SimpleNamespace(**values)
+        self.version += 1
+
+        summary = ", ".join(f"{k}={values[k]!r}" for k in sorted(changed))
+        print(f"[Config] v{self.version}: {summary}")
+        return changed
+
+    def load_file(self, path: str):
+        """讀取 JSON 檔並暫存其中的變更"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                updates = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[Config] Could not read {path}: {e}")
+            return [], [str(e)]
+
+        if not isinstance(updates, dict):
+            print(f"[Config] {path}: expected a JSON object")
+            return [], ["expected a JSON object"]
+
+        return self.stage(updates, source=path)
+
+    # ===== 背景監看（檔案 + 本機 UDP）=====
+    def start_watcher(self, path: str = None, port: int = None) -> None:
+        """
+        啟動背景執行緒：
+        - path：JSON 檔，mtime 改變就重新讀取（啟動時若存在也會先讀一次）
+        - port：在 127.0.0.1 上接收 JSON datagram，並回覆 {"ok": ..., "errors": [...]}
+        """
+        if self._watcher is not None:
+            return
+
+        sock = None
+        if port:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(("127.0.0.1", port))
+            sock.settimeout(0.5)
+            print(f"[Config] Listening on udp://127.0.0.1:{port}")
+
+        self._stop.clear()
+        self._watcher = threading.Thread(
+            target=self._watch, args=(path, sock), name="config-watcher", daemon=True
+        )
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=1.0)
+            self._watcher = None
+
+    def _watch(self, path, sock) -> None:
+        last_mtime = None
+
+        try:
+            while not self._stop.is_set():
+                # --- 檔案：比較 mtime ---
+                if path:
+                    try:
+                        mtime = os.stat(path).st_mtime
+                    except OSError:
+                        mtime = None
+                    if mtime is not None and mtime != last_mtime:
+                        last_mtime = mtime
+                        self.load_file(path)
+
+                # --- UDP：等待最多 0.5 秒（同時當作檔案輪詢間隔）---
+                if sock is None:
+                    self._stop.wait(0.5)
+                    continue
+
+                try:
+                    data, addr = sock.recvfrom(65536)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+
+                try:
+                    updates = json.loads(data.decode("utf-8"))
+                    if not isinstance(updates, dict):
+                        raise ValueError("expected a JSON object")
+                    accepted, errors = self.stage(updates, source=f"udp:{addr[1]}")
+                except ValueError as e:
+                    accepted, errors = [], [str(e)]
+
+                reply = {"ok": not errors, "accepted": accepted, "errors": errors}
+                try:
+                    sock.sendto(json.dumps(reply).encode("utf-8"), addr)
+                except OSError:
+                    pass
+        finally:
+            if sock is not None:
+                sock.close()
+
+
+# 全域預設設定：未指定 cfg 的元件都讀這一份
+CONFIG = RuntimeConfig()
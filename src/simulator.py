@@ -0,0 +1,438 @@
+# src/simulator.py
+import argparse
+import json
+import math
+import time
+
+import cv2
+import numpy as np
+
+from .birdseye import GroundPlane
+from .fake_smbus import FakeSMBus
+from .motors_l298n import MotorDriver
+from .pca9685_smbus import PCA9685
+from .pilot import Pilot
+from .runtime_config import CONFIG, RuntimeConfig
+from .vision_line import Vision
+
+# 模擬用的假 I2C bus 編號（不會與實機 /dev/i2c-N 衝突）
+SIM_BUS = 99
+
+
+def _translate(tx: float, ty: float):
+    return np.array([[1.0, 0.0, tx], [0.0, 1.0, ty], [0.0, 0.0, 1.0]])
+
+
+def _rotate(theta: float):
+    c, s = math.cos(theta), math.sin(theta)
+    return np.array([[c, -s, 0.0], [s, c, 0.0], [0.0, 0.0, 1.0]])
+
+
+class Track:
+    """
+    賽道：封閉中心線（公尺，x 向右、y 向上）+ 俯視影像（白底黑線，與實際賽道相同）
+    - nearest()：最近的中心線點 → 里程 s 與帶正負號的橫向誤差（cross-track error）
+    """
+
+    def __init__(self, centerline, px_per_m: float = 250.0, line_width: float = 0.025,
+                 margin: float = 0.6):
+        pts = np.asarray(centerline, dtype=np.float64)
+        self.points = pts
+
+        # 每段長度、累積里程、切線
+        nxt = np.roll(pts, -1, axis=0)
+        seg = nxt - pts
+        seg_len = np.hypot(seg[:, 0], seg[:, 1])
+        self.s = np.concatenate(([0.0], np.cumsum(seg_len)[:-1]))
+        self.length = float(seg_len.sum())
+        self.tangents = seg / seg_len[:, None]
+        self.step = self.length / len(pts)
+        self.line_width = line_width
+
+        # 影像座標：u = (x - x0) * ppm，v = (y1 - y) * ppm
+        self.px_per_m = px_per_m
+        self.x0 = pts[:, 0].min() - margin
+        self.y1 = pts[:, 1].max() + margin
+        w = int(math.ceil((pts[:, 0].max() + margin - self.x0) * px_per_m))
+        h = int(math.ceil((self.y1 - (pts[:, 1].min() - margin)) * px_per_m))
+
+        image = np.full((h, w, 3), 255, np.uint8)
+        px = np.column_stack(((pts[:, 0] - self.x0) * px_per_m, (self.y1 - pts[:, 1]) * px_per_m))
+        cv2.polylines(
+            image,
+            [np.round(px * 16).astype(np.int32)],
+            True,
+            (0, 0, 0),
+            max(1, int(round(line_width * px_per_m))),
+            cv2.LINE_AA,
+            4,
+        )
+        self.image = image
+
+        # 影像像素 → 世界座標（公尺）
+        self.world_from_px = np.array([
+            [1.0 / px_per_m, 0.0, self.x0],
+            [0.0, -1.0 / px_per_m, self.y1],
+            [0.0, 0.0, 1.0],
+        ])
+
+    @classmethod
+    def oval(cls, straight: float = 1.5, radius: float = 0.5, step: float = 0.005, **kwargs):
+        """
+        操場型賽道（兩段直線 + 兩個半圓），逆時針；起點 (0, -radius) 朝 +x
+        """
+        pts = []
+        n = max(2, int(straight / step))
+        for i in range(n):
+            pts.append((straight * i / n, -radius))
+
+        m = max(2, int(math.pi * radius / step))
+        for i in range(m):
+            a = -math.pi / 2 + math.pi * i / m
+            pts.append((straight + radius * math.cos(a), radius * math.sin(a)))
+
+        for i in range(n):
+            pts.append((straight - straight * i / n, radius))
+
+        for i in range(m):
+            a = math.pi / 2 + math.pi * i / m
+            pts.append((radius * math.cos(a), radius * math.sin(a)))
+
+        return cls(pts, **kwargs)
+
+    def start_pose(self):
+        """起點與切線方向 (x, y, theta)"""
+        tx, ty = self.tangents[0]
+        return float(self.points[0, 0]), float(self.points[0, 1]), math.atan2(ty, tx)
+
+    def nearest(self, x: float, y: float):
+        """
+        :return: (s, cte)；cte > 0 表示車在中心線左側
+        """
+        d = self.points - (x, y)
+        i = int(np.argmin(d[:, 0] ** 2 + d[:, 1] ** 2))
+        tx, ty = self.tangents[i]
+        dx, dy = x - self.points[i, 0], y - self.points[i, 1]
+        return float(self.s[i]), tx * dy - ty * dx
+
+
+class CameraModel:
+    """
+    合成相機影像：地面（車體座標，x 向前、y 向左）→ 影像的 homography 只在建構時算一次
+    - 影像下緣看到車前 near 公尺、寬 near_width；上緣看到 far 公尺、寬 far_width
+    - 每張影像：H_cam · (世界 → 車體) · (賽道像素 → 世界) 組成一個 3x3，再 cv2.warpPerspective
+    """
+
+    def __init__(self, width: int, height: int, near: float = 0.08, far: float = 0.40,
+                 near_width: float = 0.22, far_width: float = 0.55):
+        self.width = width
+        self.height = height
+
+        ground = np.float32([
+            (far, far_width / 2), (far, -far_width / 2),
+            (near, -near_width / 2), (near, near_width / 2),
+        ])
+        image = np.float32([(0, 0), (width - 1, 0), (width - 1, height - 1), (0, height - 1)])
+        self.H = cv2.getPerspectiveTransform(ground, image).astype(np.float64)
+        self.ground_quad = ground
+        self.image_quad = image
+        self.H_det = abs(np.linalg.det(self.H))
+        # 視野最遠角的距離：line_error 只取這個半徑內的中心線點
+        self.view_radius = float(np.hypot(ground[:, 0], ground[:, 1]).max())
+
+    def save_birdseye(self, path: str) -> None:
+        """寫出這台合成相機的鳥瞰校正檔（BIRDSEYE_FILE 格式），可在模擬中驗證 BIRDSEYE"""
+        plane = GroundPlane.from_points(self.image_quad, self.ground_quad, (self.width, self.height))
+        plane.save(path, self.image_quad, self.ground_quad)
+
+    def render(self, track: Track, x: float, y: float, theta: float):
+        vehicle_from_world = _rotate(-theta) @ _translate(-x, -y)
+        M = self.H @ vehicle_from_world @ track.world_from_px
+        return cv2.warpPerspective(
+            track.image,
+            M,
+            (self.width, self.height),
+            flags=cv2.INTER_LINEAR,
+            borderMode=cv2.BORDER_CONSTANT,
+            borderValue=(255, 255, 255),
+        )
+
+    def line_error(self, track: Track, x: float, y: float, theta: float):
+        """
+        不畫影像、直接算 Vision 會得到的 (error, confidence)（自動調參用，快很多）
+        - 把中心線點投影到影像，留下落在畫面內的點
+        - 每點依該處的像素密度（homography 的 Jacobian 行列式）加權，近似 Vision 的面積質心
+        """
+        d = track.points - (x, y)
+        near = d[:, 0] ** 2 + d[:, 1] ** 2 < self.view_radius ** 2
+        if not near.any():
+            return 0.0, 0.0
+
+        c, s = math.cos(theta), math.sin(theta)
+        gx = c * d[near, 0] + s * d[near, 1]
+        gy = -s * d[near, 0] + c * d[near, 1]
+
+        H = self.H
+        w = H[2, 0] * gx + H[2, 1] * gy + H[2, 2]
+        u = (H[0, 0] * gx + H[0, 1] * gy + H[0, 2]) / w
+        v = (H[1, 0] * gx + H[1, 1] * gy + H[1, 2]) / w
+        inside = (w > 0) & (u >= 0) & (u < self.width) & (v >= 0) & (v < self.height)
+        if not inside.any():
+            return 0.0, 0.0
+
+        weight = self.H_det / np.abs(w[inside]) ** 3
+        cx = float(np.sum(u[inside] * weight) / np.sum(weight))
+        half = self.width / 2
+        area = float(np.sum(weight)) * track.step * track.line_width
+        return (cx - half) / half, min(1.0, area / (self.width * self.height))
+
+
+class VehicleModel:
+    """
+    差速車運動學 + 簡單馬達模型
+    - duty 低於 deadband（靜摩擦）時輪子不轉，之上線性到 v_max
+    - 輪速對目標一階延遲（tau）
+    - polarity：馬達接線方向；PDController 會把命令取負號，實車 -1 為前進
+    """
+
+    def __init__(self, wheel_base: float = 0.16, v_max: float = 1.0, deadband: float = 0.1,
+                 tau: float = 0.08, polarity: float = -1.0):
+        self.wheel_base = wheel_base
+        self.v_max = v_max
+        self.deadband = deadband
+        self.tau = tau
+        self.polarity = polarity
+
+        self.x = self.y = self.theta = 0.0
+        self.v_left = self.v_right = 0.0
+
+    def reset(self, x: float, y: float, theta: float) -> None:
+        self.x, self.y, self.theta = x, y, theta
+        self.v_left = self.v_right = 0.0
+
+    def wheel_speed(self, duty: float) -> float:
+        """帶方向的 duty → 穩態輪速（m/s）"""
+        mag = abs(duty)
+        if mag <= self.deadband:
+            return 0.0
+        v = self.v_max * (mag - self.deadband) / (1.0 - self.deadband)
+        return math.copysign(v, duty) * self.polarity
+
+    def step(self, duty_left: float, duty_right: float, dt: float) -> None:
+        alpha = dt / (self.tau + dt) if self.tau > 0 else 1.0
+        self.v_left += alpha * (self.wheel_speed(duty_left) - self.v_left)
+        self.v_right += alpha * (self.wheel_speed(duty_right) - self.v_right)
+
+        v = 0.5 * (self.v_left + self.v_right)
+        w = (self.v_right - self.v_left) / self.wheel_base
+        self.x += v * math.cos(self.theta) * dt
+        self.y += v * math.sin(self.theta) * dt
+        self.theta += w * dt
+
+
+class Simulator:
+    """
+    閉迴路模擬（不需要實車，跑得比實際時間快）
+    Track 影像 → CameraModel → Vision.process → Pilot → MotorDriver
+      → PCA9685（FakeSMBus 上的 FakePCA9685）→ 讀回暫存器的 duty → VehicleModel
+    使用與實車相同的 Vision / Pilot / MotorDriver / PCA9685 程式碼，
+    可作為速度 / 延遲相關修改的基準（lap time、cross-track error）
+    sensor="model"：不畫影像、不跑 Vision，直接用 CameraModel.line_error（自動調參用）
+    """
+
+    SENSORS = ("camera", "model")
+
+    def __init__(self, cfg=None, track: Track = None, vehicle: VehicleModel = None,
+                 camera: CameraModel = None, sensor: str = "camera"):
+        if sensor not in self.SENSORS:
+            raise ValueError(f"sensor must be one of {self.SENSORS}, got {sensor!r}")
+
+        self.cfg = cfg if cfg is not None else CONFIG
+        cfg = self.cfg
+        self.sensor = sensor
+
+        self.track = track if track is not None else Track.oval()
+        self.vehicle = vehicle if vehicle is not None else VehicleModel()
+        self.camera = camera if camera is not None else CameraModel(cfg.CAM_WIDTH, cfg.CAM_HEIGHT)
+
+        # 假 PCA9685：馬達命令經過真正的 PCA9685 / MotorDriver 程式碼寫入暫存器
+        self.device = FakeSMBus.attach(SIM_BUS, cfg.PCA_ADDR)
+        self.device.power_on()
+        self.pca = PCA9685(SIM_BUS, cfg.PCA_ADDR, bus=FakeSMBus(SIM_BUS))
+        self.pca.set_frequency(cfg.PCA_FREQ)
+
+        self.motors = MotorDriver(self.pca, cfg)
+        self.vision = Vision(cfg)
+        self.pilot = Pilot(cfg)
+
+    def _wheel_duty(self, en: int, in_a: int, in_b: int) -> float:
+        """由 PCA 暫存器讀回 L298N 的有效 duty（帶方向；兩個方向腳同電位 = 煞車 / 停）"""
+        a = self.device.duty(in_a) > 0.5
+        b = self.device.duty(in_b) > 0.5
+        if a == b:
+            return 0.0
+        return self.device.duty(en) if a else -self.device.duty(en)
+
+    def run(self, laps: int = 1, max_time: float = 120.0, max_cte: float = 0.2,
+            physics_dt: float = 0.002, on_tick=None) -> dict:
+        """
+        :param laps: 跑幾圈
+        :param max_time: 模擬時間上限（秒）
+        :param max_cte: 橫向誤差超過此值（公尺）視為出界，提前結束
+        :param on_tick: 每個 tick 呼叫 on_tick(sim, frame, debug)（例如顯示畫面），可為 None；
+                        sensor="model" 時 frame / debug 為 None
+        :return: 結果 dict（lap_times、cte_rms、cte_max、speedup ...）
+        """
+        cfg = self.cfg
+        track = self.track
+        vehicle = self.vehicle
+        vehicle.reset(*track.start_pose())
+
+        period = 1.0 / cfg.CONTROL_HZ
+        frame_period = 1.0 / cfg.CAM_FPS
+        substeps = max(1, int(round(period / physics_dt)))
+
+        t = 0.0
+        next_frame = 0.0
+        frame = debug = None
+        progress = 0.0
+        last_s, _ = track.nearest(vehicle.x, vehicle.y)
+        lap_start = 0.0
+        lap_times = []
+        cte_sq = cte_abs = cte_max = 0.0
+        distance = 0.0
+        ticks = 0
+        off_track = False
+
+        wall_start = time.perf_counter()
+        while t < max_time and len(lap_times) < laps:
+            # --- 相機：依 CAM_FPS 出新影像（CONTROL_HZ 較快時沿用上一張）---
+            if t >= next_frame:
+                next_frame += frame_period
+                if self.sensor == "camera":
+                    frame = self.camera.render(track, vehicle.x, vehicle.y, vehicle.theta)
+                    error, conf, _, debug = self.vision.process(frame)
+                else:
+                    error, conf = self.camera.line_error(track, vehicle.x, vehicle.y, vehicle.theta)
+
+            # --- 與 main() 相同的控制流程 ---
+            self.pca.begin_tick()
+            _, _, left_cmd, right_cmd = self.pilot.step(error, conf, t, period)
+            self.motors.set(left_cmd, right_cmd, period)
+            self.pca.end_tick()
+
+            if on_tick is not None:
+                on_tick(self, frame, debug)
+
+            # --- 物理：讀回暫存器 → 車輛模型 ---
+            duty_left = self._wheel_duty(cfg.PIN_L_ENA, cfg.PIN_L_IN1, cfg.PIN_L_IN2)
+            duty_right = self._wheel_duty(cfg.PIN_R_ENB, cfg.PIN_R_IN3, cfg.PIN_R_IN4)
+            x0, y0 = vehicle.x, vehicle.y
+            for _ in range(substeps):
+                vehicle.step(duty_left, duty_right, period / substeps)
+            distance += math.hypot(vehicle.x - x0, vehicle.y - y0)
+            t += period
+            ticks += 1
+
+            # --- 指標：里程（處理繞圈回到 0）、橫向誤差 ---
+            s, cte = track.nearest(vehicle.x, vehicle.y)
+            ds = s - last_s
+            if ds < -track.length / 2:
+                ds += track.length
+            elif ds > track.length / 2:
+                ds -= track.length
+            progress += ds
+            last_s = s
+
+            cte_sq += cte * cte
+            cte_abs += abs(cte)
+            cte_max = max(cte_max, abs(cte))
+
+            if progress >= track.length * (len(lap_times) + 1):
+                lap_times.append(t - lap_start)
+                lap_start = t
+
+            if abs(cte) > max_cte:
+                off_track = True
+                break
+
+        wall = time.perf_counter() - wall_start
+        return {
+            "laps": len(lap_times),
+            "lap_times": lap_times,
+            "best_lap": min(lap_times) if lap_times else None,
+            "off_track": off_track,
+            "sim_time": t,
+            "wall_time": wall,
+            "speedup": t / wall if wall > 0 else float("inf"),
+            "ticks": ticks,
+            "progress": progress,
+            "avg_speed": distance / t if t > 0 else 0.0,
+            "cte_rms": math.sqrt(cte_sq / ticks) if ticks else 0.0,
+            "cte_mean_abs": cte_abs / ticks if ticks else 0.0,
+            "cte_max": cte_max,
+            "i2c_errors": self.pca.stats.errors,
+        }
+
+
+def _parse_overrides(items):
+    """--set KEY=VALUE（VALUE 以 JSON 解析，失敗則當字串）"""
+    overrides = {}
+    for item in items or []:
+        key, _, value = item.partition("=")
+        try:
+            overrides[key] = json.loads(value)
+        except ValueError:
+            overrides[key] = value
+    return overrides
+
+
+def _run_simulator():
+    """
+    測試指令：python3 -m src.simulator --laps 2 --set SPEED_SCHEDULE=true
+    """
+    parser = argparse.ArgumentParser(description="Closed-loop line follower simulator")
+    parser.add_argument("--laps", type=int, default=1)
+    parser.add_argument("--straight", type=float, default=1.5, help="straight length (m)")
+    parser.add_argument("--radius", type=float, default=0.5, help="curve radius (m)")
+    parser.add_argument("--max-time", type=float, default=120.0, help="simulated seconds")
+    parser.add_argument("--set", action="append", metavar="KEY=VALUE",
+                        help="config override, e.g. --set KP=0.3")
+    parser.add_argument("--sensor", choices=Simulator.SENSORS, default="camera",
+                        help="'model' skips rendering / Vision (fast, approximate)")
+    parser.add_argument("--show", action="store_true", help="show camera / debug windows")
+    parser.add_argument("--write-birdseye", metavar="PATH",
+                        help="write the synthetic camera's BIRDSEYE_FILE calibration and exit")
+    args = parser.parse_args()
+
+    cfg = RuntimeConfig(_parse_overrides(args.set))
+    if args.write_birdseye:
+        CameraModel(cfg.CAM_WIDTH, cfg.CAM_HEIGHT).save_birdseye(args.write_birdseye)
+        print(f"Wrote {args.write_birdseye}")
+        return
+
+    sim = Simulator(cfg, track=Track.oval(args.straight, args.radius), sensor=args.sensor)
+
+    on_tick = None
+    if args.show and args.sensor == "camera":
+        def on_tick(_, frame, debug):
+            cv2.imshow("Sim Camera", frame)
+            cv2.imshow("Sim Debug", debug)
+            cv2.waitKey(1)
+
+    result = sim.run(laps=args.laps, max_time=args.max_time, on_tick=on_tick)
+
+    print("--- Simulation Result ---")
+    print(f"Track length : {sim.track.length:.2f} m")
+    print(f"Laps         : {result['laps']} / {args.laps}"
+          f"{'  (OFF TRACK)' if result['off_track'] else ''}")
+    for i, lap in enumerate(result["lap_times"], 1):
+        print(f"  Lap {i}: {lap:.2f} s")
+    print(f"Avg speed    : {result['avg_speed']:.2f} m/s")
+    print(f"CTE rms/max  : {result['cte_rms'] * 100:.1f} / {result['cte_max'] * 100:.1f} cm")
+    print(f"Sim / wall   : {result['sim_time']:.1f} s / {result['wall_time']:.1f} s "
+          f"({result['speedup']:.1f}x real time)")
+
+
+if __name__ == "__main__":
+    _run_simulator()
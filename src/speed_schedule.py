@@ -0,0 +1,119 @@
+# src/speed_schedule.py
+from collections import deque
+
+from .runtime_config import CONFIG
+
+
+def interpolate_gains(table, speed: float):
+    """
+    依速度在 GAIN_TABLE 中線性內插 KP / KD
+    :param table: ((speed, kp, kd), ...)，依 speed 由小到大排序
+    :param speed: 目前速度
+    :return: (kp, kd)；超出表格範圍時取端點值
+    """
+    if speed <= table[0][0]:
+        return table[0][1], table[0][2]
+    if speed >= table[-1][0]:
+        return table[-1][1], table[-1][2]
+
+    for (s0, kp0, kd0), (s1, kp1, kd1) in zip(table, table[1:]):
+        if speed <= s1:
+            t = (speed - s0) / (s1 - s0) if s1 > s0 else 0.0
+            return kp0 + t * (kp1 - kp0), kd0 + t * (kd1 - kd0)
+
+    return table[-1][1], table[-1][2]
+
+
+def _ramp(value: float, x_max: float) -> float:
+    """0 時回傳 1.0，達到 x_max（含以上）時回傳 0.0，中間線性"""
+    if x_max <= 0.0:
+        return 1.0
+    return max(0.0, 1.0 - value / x_max)
+
+
+class SpeedScheduler:
+    """
+    速度排程（Gain Scheduling）
+    - 輸入：每個 tick 的 error / confidence（來自 Vision.process）
+    - 依「直線程度」決定目標速度：
+        * 近期 error 變異數小、|error| 小、error 變化率小、confidence 高 → 直線，往 SPEED_MAX 加速
+        * 任一項變差 → 彎道（或即將進彎），往 SPEED_MIN 減速
+    - 加速慢（SPEED_RAMP_UP）、減速快（SPEED_RAMP_DOWN），避免進彎太快
+    - 輸出：base_speed 以及依速度內插的 KP / KD
+    """
+
+    def __init__(self, cfg=None):
+        # 執行期設定（可熱更新）；未指定則使用全域 CONFIG
+        self.cfg = cfg if cfg is not None else CONFIG
+
+        # 近期誤差（計算變異數）
+        self.errors = deque(maxlen=self.cfg.SPEED_WINDOW)
+        self.prev_error = None
+
+        # 目前排程出的速度（從最慢開始）
+        self.speed = self.cfg.SPEED_MIN
+
+    def reset(self) -> None:
+        """掉線 / 停車後重新開始：清除歷史並回到 SPEED_MIN"""
+        # SPEED_WINDOW 熱更新後，在這裡換成新長度
+        if self.errors.maxlen != self.cfg.SPEED_WINDOW:
+            self.errors = deque(maxlen=self.cfg.SPEED_WINDOW)
+        self.errors.clear()
+        self.prev_error = None
+        self.speed = self.cfg.SPEED_MIN
+
+    def straightness(self, error: float, conf: float, dt: float) -> float:
+        """
+        估計目前路段「有多直」
+        :return: 0.0（彎道 / 不確定）~ 1.0（直線）
+        """
+        cfg = self.cfg
+
+        self.errors.append(error)
+
+        # 1) 近期 error 變異數
+        n = len(self.errors)
+        mean = sum(self.errors) / n
+        var = sum((e - mean) ** 2 for e in self.errors) / n
+
+        # 2) error 變化率（彎道前 error 會先開始快速變化）
+        if self.prev_error is None:
+            rate = 0.0
+        else:
+            rate = abs(error - self.prev_error) / dt
+        self.prev_error = error
+
+        # 3) confidence（線條越完整越可信）
+        conf_factor = min(1.0, conf / cfg.SPEED_CONF_FULL) if cfg.SPEED_CONF_FULL > 0 else 1.0
+
+        return min(
+            _ramp(var, cfg.SPEED_ERR_VAR_MAX),
+            _ramp(abs(error), cfg.SPEED_ERR_ABS_MAX),
+            _ramp(rate, cfg.SPEED_ERR_RATE_MAX),
+            conf_factor,
+        )
+
+    def update(self, error: float, conf: float, dt: float = None):
+        """
+        更新一次速度排程
+        :param error: Vision 的 error（-1.0 ~ 1.0）
+        :param conf: Vision 的 confidence（0.0 ~ 1.0）
+        :param dt: 實際迴圈週期（秒）；None 則視為 1/CONTROL_HZ
+        :return: (base_speed, kp, kd)
+        """
+        cfg = self.cfg
+
+        if dt is None:
+            dt = 1.0 / cfg.CONTROL_HZ
+        dt = max(cfg.DT_MIN, min(cfg.DT_MAX, dt))
+
+        target = cfg.SPEED_MIN + (cfg.SPEED_MAX - cfg.SPEED_MIN) * self.straightness(error, conf, dt)
+
+        # 非對稱 ramp：加速慢、減速快
+        if target > self.speed:
+            self.speed = min(target, self.speed + cfg.SPEED_RAMP_UP * dt)
+        else:
+            self.speed = max(target, self.speed - cfg.SPEED_RAMP_DOWN * dt)
+
+        kp, kd = interpolate_gains(cfg.GAIN_TABLE, self.speed)
+        return self.speed, kp, kd
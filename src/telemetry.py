@@ -0,0 +1,245 @@
+# src/telemetry.py
+import asyncio
+import json
+import threading
+import time
+
+import cv2
+
+from .runtime_config import CONFIG
+
+
+class TelemetryServer:
+    """
+    本機遙測伺服器（asyncio，跑在背景執行緒）
+    - 主迴圈每個 tick 呼叫 publish()：只做「放進去」的動作，不做編碼、不等待網路
+    - 每 tick 的數值 → 所有 client
+    - debug / mask 影像依 TELEMETRY_FRAME_HZ 節流，在背景 executor 做 JPEG 編碼
+    - client 跟不上（queue 滿）就直接丟掉，不會拖慢控制迴圈
+
+    傳輸格式（TCP，一行一筆 JSON）：
+      {"type": "tick", "t": ..., "err": ..., ...}\\n
+      {"type": "frame", "name": "debug", "t": ..., "size": N}\\n  後面緊接 N bytes JPEG
+    """
+
+    def __init__(self, port: int = None, host: str = "127.0.0.1", cfg=None):
+        self.cfg = cfg if cfg is not None else CONFIG
+        self.host = host
+        self.port = port if port is not None else self.cfg.TELEMETRY_PORT
+
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+        # 每個 client 一個 queue（只在 asyncio 執行緒內存取）
+        self._clients = set()
+        self.client_count = 0
+
+        # 影像節流 / 編碼狀態
+        self._last_frame_time = 0.0
+        self._encoding = False
+
+        # 統計
+        self.sent = 0
+        self.dropped = 0
+
+    # ===== 啟動 / 停止 =====
+    def start(self) -> None:
+        """在背景執行緒啟動 asyncio 伺服器（綁定失敗會丟出 OSError）"""
+        self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=2.0)
+
+        if self._server is None:
+            raise OSError(f"Telemetry server could not bind {self.host}:{self.port}")
+        print(f"[Telemetry] Serving on tcp://{self.host}:{self.port}")
+
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=2.0)
+        self._loop = None
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+
+        try:
+            self._server = loop.run_until_complete(
+                asyncio.start_server(self._handle_client, self.host, self.port)
+            )
+        except OSError as e:
+            print(f"[Telemetry] {e}")
+            self._loop = None
+            self._ready.set()
+            loop.close()
+            return
+
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            self._server.close()
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+
+    # ===== 主迴圈呼叫（控制執行緒）=====
+    def publish(self, tick: dict, debug=None, mask=None) -> None:
+        """
+        發佈一個 tick 的資料（非阻塞）
+        :param tick: 數值（會轉成 JSON）
+        :param debug, mask: Vision 的輸出影像；每次都是新配置的陣列，這裡只保留參考不複製
+        """
+        # 沒有 client 時完全不做事
+        if self._loop is None or self.client_count == 0:
+            return
+
+        self._loop.call_soon_threadsafe(self._broadcast, self._encode_tick(tick))
+
+        if debug is None and mask is None:
+            return
+
+        # 影像節流：上一張還在編碼或還沒到時間就跳過
+        frame_hz = self.cfg.TELEMETRY_FRAME_HZ
+        now = time.monotonic()
+        if frame_hz <= 0 or self._encoding or now - self._last_frame_time < 1.0 / frame_hz:
+            return
+
+        self._last_frame_time = now
+        self._encoding = True
+        frames = {"debug": debug, "mask": mask}
+        self._loop.call_soon_threadsafe(self._schedule_encode, frames, tick.get("t", now))
+
+    @staticmethod
+    def _encode_tick(tick: dict) -> bytes:
+        return (json.dumps(dict(tick, type="tick")) + "\n").encode("utf-8")
+
+    # ===== asyncio 執行緒 =====
+    def _schedule_encode(self, frames: dict, t: float) -> None:
+        asyncio.ensure_future(self._encode_frames(frames, t))
+
+    async def _encode_frames(self, frames: dict, t: float) -> None:
+        """JPEG 編碼丟到 executor（cv2.imencode 會釋放 GIL）"""
+        quality = [cv2.IMWRITE_JPEG_QUALITY, int(self.cfg.TELEMETRY_JPEG_QUALITY)]
+        try:
+            for name, img in frames.items():
+                if img is None:
+                    continue
+                ok, buf = await self._loop.run_in_executor(None, cv2.imencode, ".jpg", img, quality)
+                if not ok:
+                    continue
+                data = buf.tobytes()
+                header = {"type": "frame", "name": name, "t": t, "size": len(data)}
+                self._broadcast(json.dumps(header).encode("utf-8") + b"\n" + data)
+        finally:
+            self._encoding = False
+
+    def _broadcast(self, payload: bytes) -> None:
+        """放進每個 client 的 queue；滿了就丟掉（背壓時降級，不阻塞）"""
+        for queue in self._clients:
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    async def _handle_client(self, reader, writer) -> None:
+        """
+        每個 client 兩個 task：送出 queue 裡的資料、等 client 那端關閉（EOF）
+        沒有資料可送時也能馬上發現斷線 / 半關閉，不會把斷掉的 client 留在廣播名單裡
+        """
+        peer = writer.get_extra_info("peername")
+        queue = asyncio.Queue(maxsize=self.cfg.TELEMETRY_QUEUE)
+        self._clients.add(queue)
+        self.client_count = len(self._clients)
+        print(f"[Telemetry] Client connected: {peer}")
+
+        tasks = [
+            asyncio.ensure_future(self._send_loop(queue, writer)),
+            asyncio.ensure_future(self._wait_eof(reader)),
+        ]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._clients.discard(queue)
+            self.client_count = len(self._clients)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+            print(f"[Telemetry] Client disconnected: {peer}")
+
+    async def _send_loop(self, queue, writer) -> None:
+        try:
+            while True:
+                payload = await queue.get()
+                writer.write(payload)
+                await writer.drain()
+                self.sent += 1
+        except ConnectionError:
+            pass
+
+    @staticmethod
+    async def _wait_eof(reader) -> None:
+        """client 送來的資料一律丟掉，讀到 EOF（關閉或半關閉）就結束"""
+        try:
+            while await reader.read(4096):
+                pass
+        except ConnectionError:
+            pass
+
+
+def _run_telemetry_client(host: str = "127.0.0.1", port: int = None, save_dir: str = None):
+    """
+    測試模式：連上遙測伺服器，印出每個 tick，影像可存成檔案（只保留最新一張）
+    """
+    port = port if port is not None else CONFIG.TELEMETRY_PORT
+
+    async def client():
+        reader, _ = await asyncio.open_connection(host, port)
+        print(f"--- Connected to {host}:{port} ---")
+        frames = 0
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            msg = json.loads(line)
+
+            if msg["type"] == "frame":
+                data = await reader.readexactly(msg["size"])
+                frames += 1
+                if save_dir:
+                    with open(f"{save_dir}/{msg['name']}.jpg", "wb") as f:
+                        f.write(data)
+                continue
+
+            print(
+                f"\r{msg.get('state', '')} Err: {msg.get('err', 0):+.2f} "
+                f"| Conf: {msg.get('conf', 0):.2f} | dt: {msg.get('dt', 0) * 1000:.1f} ms "
+                f"| frames: {frames}",
+                end="",
+            )
+
+    try:
+        asyncio.run(client())
+    except KeyboardInterrupt:
+        pass
+    print("\nDone.")
+
+
+if __name__ == "__main__":
+    # 測試指令：python3 -m src.telemetry [port] [save_dir]
+    import sys
+
+    _run_telemetry_client(
+        port=int(sys.argv[1]) if len(sys.argv) > 1 else None,
+        save_dir=sys.argv[2] if len(sys.argv) > 2 else None,
+    )
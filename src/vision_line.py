@@ -1,7 +1,8 @@
 # src/vision_line.py
 import cv2
 import numpy as np
-from .config import *
+from .birdseye import GroundPlane
+from .runtime_config import CONFIG
 
 
 class Vision:
@@ -10,10 +11,157 @@ class Vision:
     - 從影像中取 ROI（通常是下方區域）
     - 二值化分割線條
     - 形態學去噪
-    - 用 moments 計算線條質心（centroid）
+    - 連通區塊選線（LINE_SELECT）或整張 mask 的 moments 計算線條質心（centroid）
     - 輸出 error（偏差）與 confidence（可信度）
+    - BIRDSEYE：error 改以地面上的橫向距離計算（遠近同樣的偏移給同樣的 error）
+    - FRAME_REUSE：ROI 與上次處理的影像幾乎相同時直接沿用上次結果（停車 / 重複 frame）
     """
 
+    # 變化偵測用的縮圖尺寸
+    THUMB_SIZE = (32, 24)
+
+    def __init__(self, cfg=None):
+        # 執行期設定（可熱更新）；未指定則使用全域 CONFIG
+        self.cfg = cfg if cfg is not None else CONFIG
+
+        # 上一張選中的線：(x 位置 [-1, 1], 方向 [rad])；掉線時清掉
+        self.track = None
+
+        # 鳥瞰校正（BIRDSEYE_FILE 改變時才重新讀檔）
+        self._ground = None
+        self._ground_path = None
+
+        # 變化偵測：上次「完整處理」那張的縮圖、結果、設定版本，與連續沿用次數
+        self._thumb = None
+        self._result = None
+        self._result_version = None
+        self._reuse_age = 0
+        self.reuse_hits = 0
+        self.reuse_misses = 0
+
+    def _unchanged(self, thumb) -> bool:
+        """
+        縮圖與上次完整處理的那張比較（平均絕對差，灰階值）
+        設定變更後、或已連續沿用 FRAME_REUSE_MAX_AGE 次時一定重新處理
+        """
+        cfg = self.cfg
+        if self._thumb is None or self._result_version != getattr(cfg, "version", None):
+            return False
+        if self._reuse_age >= cfg.FRAME_REUSE_MAX_AGE:
+            return False
+        if thumb.shape != self._thumb.shape:
+            return False
+        mad = cv2.norm(thumb, self._thumb, cv2.NORM_L1) / thumb.size
+        return mad < cfg.FRAME_REUSE_MAD
+
+    def _ground_plane(self):
+        """BIRDSEYE 開啟時回傳 GroundPlane（讀檔失敗則為 None，退回像素 error）"""
+        cfg = self.cfg
+        if cfg.BIRDSEYE not in ("points", "remap"):
+            return None
+        if cfg.BIRDSEYE_FILE != self._ground_path:
+            self._ground_path = cfg.BIRDSEYE_FILE
+            self._ground = GroundPlane.load(cfg.BIRDSEYE_FILE)
+        return self._ground
+
+    @staticmethod
+    def _line_points(mask, bbox, y_offset: int, rows: int = 8):
+        """
+        在線的範圍內（bbox；None 則整張 mask）等距取 rows 條橫列，每列取白色像素的平均 x
+        :return: [(x, y), ...]，y 為整張影像座標
+        """
+        if bbox is None:
+            x0, y0, bw, bh = 0, 0, mask.shape[1], mask.shape[0]
+        else:
+            x0, y0, bw, bh = bbox
+        y1 = min(y0 + bh, mask.shape[0]) - 1
+
+        points = []
+        for r in np.linspace(y0, y1, rows).astype(int):
+            xs = np.flatnonzero(mask[r, x0:x0 + bw])
+            if xs.size:
+                points.append((x0 + xs.mean(), r + y_offset))
+        return points
+
+    def _select_component(self, mask):
+        """
+        連通區塊選線（固定成本）：
+        - mask 先縮小 CC_SCALE 倍再 connectedComponentsWithStats（成本只和縮小後的尺寸有關）
+        - 只評估面積最大的 CC_MAX_CANDIDATES 塊（每塊算一次 bbox 內的 moments）
+        - 選中的那一塊再回原尺寸 mask 的 bbox 內算質心（error 保持原本的像素解析度）
+        - 分數 = CC_POS_WEIGHT * |x - 上次 x| + CC_HEADING_WEIGHT * |方向 - 上次方向|，取最小
+          （沒有上次的線時，以畫面中央、垂直方向為預測）
+        :return: (cx, cy, confidence, bbox)，座標為 ROI 原尺寸；沒有合格區塊時回傳 None
+        """
+        cfg = self.cfg
+        h, w = mask.shape[:2]
+        scale = cfg.CC_SCALE
+
+        small = mask
+        if 0.0 < scale < 1.0:
+            small = cv2.resize(mask, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST)
+        sh, sw = small.shape[:2]
+
+        n, labels, stats, centroids = cv2.connectedComponentsWithStats(small, connectivity=8)
+
+        # label 0 是背景；過小的區塊（雜訊）不算
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        min_area = cfg.CC_MIN_AREA * sw * sh
+        order = [i + 1 for i in np.argsort(-areas) if areas[i] >= min_area]
+        if not order:
+            self.track = None
+            return None
+
+        pred_x, pred_heading = self.track if self.track is not None else (0.0, 0.0)
+
+        best = None
+        for i in order[:cfg.CC_MAX_CANDIDATES]:
+            x, y, bw, bh, area = stats[i]
+            cx, cy = centroids[i]
+            pos = (cx - sw / 2) / (sw / 2)
+
+            # 方向：二階中心矩的主軸與垂直方向的夾角（線往右下斜為正）
+            m = cv2.moments((labels[y:y + bh, x:x + bw] == i).astype(np.uint8), True)
+            heading = 0.5 * np.arctan2(2 * m["mu11"], m["mu02"] - m["mu20"])
+
+            # 主軸方向以 π 為週期（+89° 與 -89° 幾乎是同一條線）：差值折回 [-π/2, π/2)
+            d_heading = (heading - pred_heading + np.pi / 2) % np.pi - np.pi / 2
+
+            cost = (
+                cfg.CC_POS_WEIGHT * abs(pos - pred_x)
+                + cfg.CC_HEADING_WEIGHT * abs(d_heading)
+            )
+            if best is None or cost < best[0]:
+                best = (cost, i, pos, heading)
+
+        _, i, pos, heading = best
+        self.track = (pos, heading)
+
+        x, y, bw, bh, area = stats[i]
+        cx, cy = centroids[i]
+        sx, sy = w / sw, h / sh
+        bbox = (int(x * sx), int(y * sy), int(bw * sx), int(bh * sy))
+
+        # 質心改在原尺寸 mask 上算（縮小後的質心只有 1/CC_SCALE px 的解析度，D 項會看到階梯）：
+        # 選中的區塊外擴一格後放大回原尺寸當遮罩，只取這一塊的像素
+        if small is not mask:
+            x0, y0 = max(0, x - 1), max(0, y - 1)
+            x1, y1 = min(sw, x + bw + 1), min(sh, y + bh + 1)
+            fx0, fy0 = int(x0 * sx), int(y0 * sy)
+            fx1, fy1 = min(w, int(round(x1 * sx))), min(h, int(round(y1 * sy)))
+            sel = cv2.dilate((labels[y0:y1, x0:x1] == i).astype(np.uint8), np.ones((3, 3), np.uint8))
+            sel = cv2.resize(sel, (fx1 - fx0, fy1 - fy0), interpolation=cv2.INTER_NEAREST)
+            M = cv2.moments(cv2.bitwise_and(mask[fy0:fy1, fx0:fx1], mask[fy0:fy1, fx0:fx1], mask=sel), True)
+            if M["m00"] > 0:
+                return (
+                    int(fx0 + M["m10"] / M["m00"]),
+                    int(fy0 + M["m01"] / M["m00"]),
+                    float(area) / (sw * sh),
+                    bbox,
+                )
+
+        return int(cx * sx), int(cy * sy), float(area) / (sw * sh), bbox
+
     def process(self, frame):
         """
         影像處理主流程
@@ -27,14 +175,36 @@ class Vision:
             mask (image): 二值化遮罩圖（0/255）
             debug_frame (image): 附帶標示中心線與質心的可視化影像（ROI 範圍）
         """
+        cfg = self.cfg
         h, w = frame.shape[:2]
 
         # ===== 1) ROI 選取 =====
         # 只取畫面某個垂直比例範圍（例如下方），降低干擾並加速運算
-        y_start = int(h * ROI_Y_START_RATIO)
-        y_end = int(h * ROI_Y_END_RATIO)
+        y_start = int(h * cfg.ROI_Y_START_RATIO)
+        y_end = int(h * cfg.ROI_Y_END_RATIO)
         roi = frame[y_start:y_end, 0:w]
 
+        # ===== 1a) 變化偵測：幾乎沒變就沿用上次的 (error, confidence, mask, debug) =====
+        thumb = None
+        if cfg.FRAME_REUSE:
+            thumb = cv2.cvtColor(
+                cv2.resize(roi, self.THUMB_SIZE, interpolation=cv2.INTER_AREA),
+                cv2.COLOR_BGR2GRAY,
+            )
+            if self._unchanged(thumb):
+                self._reuse_age += 1
+                self.reuse_hits += 1
+                return self._result
+            self.reuse_misses += 1
+
+        # 鳥瞰校正：remap 把整個 ROI 轉成俯視圖（之後的 x 就是地面橫向位置，±BIRDSEYE_HALF_WIDTH）；
+        # points 只在最後轉換幾個線上的點（便宜很多）
+        plane = self._ground_plane()
+        birdseye = cfg.BIRDSEYE if plane is not None else "off"
+        if birdseye == "remap":
+            border = (255, 255, 255) if cfg.INVERT_THRESH else (0, 0, 0)
+            roi = plane.warp(roi, w, h, y_start, y_end, cfg.BIRDSEYE_HALF_WIDTH, border)
+
         # ===== 2) 前處理：灰階 + 高斯模糊 =====
         # 灰階：降低通道
         # 模糊：降低雜訊，讓 threshold 更穩
@@ -44,8 +214,8 @@ class Vision:
         # ===== 3) 二值化（Thresholding）=====
         # INVERT_THRESH=True：使用 THRESH_BINARY_INV（黑白反轉）
         # INVERT_THRESH=False：使用 THRESH_BINARY
-        thresh_type = cv2.THRESH_BINARY_INV if INVERT_THRESH else cv2.THRESH_BINARY
-        _, mask = cv2.threshold(blur, THRESH_VAL, 255, thresh_type)
+        thresh_type = cv2.THRESH_BINARY_INV if cfg.INVERT_THRESH else cv2.THRESH_BINARY
+        _, mask = cv2.threshold(blur, cfg.THRESH_VAL, 255, thresh_type)
 
         # ===== 4) 形態學去噪（Morphology）=====
         # OPEN：先 erode 再 dilate，去除小白點雜訊
@@ -55,22 +225,37 @@ class Vision:
         mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
 
         # ===== 5) 計算質心（Centroid）與輸出 error / confidence =====
-        # moments 可以得到白色區域的面積與一階矩，用於算質心
-        M = cv2.moments(mask)
+        # LINE_SELECT：只取「最像賽道線」的那一塊（岔路 / 十字 / 旁邊的標記不會把質心拉到兩線中間）
+        # 否則：整張 mask 的 moments（原本做法）
+        bbox = None
+        if cfg.LINE_SELECT:
+            found = self._select_component(mask)
+            if found is not None:
+                cx, cy, confidence, bbox = found
+        else:
+            # moments 可以得到白色區域的面積與一階矩，用於算質心
+            M = cv2.moments(mask)
+            found = M["m00"] > 0
+            if found:
+                # m00：面積（像素值加總），對二值圖而言近似白色面積 * 255
+                cx = int(M["m10"] / M["m00"])
+                cy = int(M["m01"] / M["m00"])
 
-        if M["m00"] > 0:
-            # m00：面積（像素值加總），對二值圖而言近似白色面積 * 255
-            cx = int(M["m10"] / M["m00"])
-            cy = int(M["m01"] / M["m00"])
+                # confidence：白色面積比例（0~1）
+                # M["m00"] 大約是（白色像素數 * 255）
+                confidence = M["m00"] / (255 * mask.size)
 
+        if found:
             # error 正規化到 [-1, 1]
             # cx < w/2 => 負（偏左）
             # cx > w/2 => 正（偏右）
             error = (cx - (w / 2)) / (w / 2)
 
-            # confidence：白色面積比例（0~1）
-            # M["m00"] 大約是（白色像素數 * 255）
-            confidence = M["m00"] / (255 * mask.size)
+            if birdseye == "points":
+                # 線上幾個點轉到地面，以平均橫向偏移（公尺）算 error
+                points = self._line_points(mask, bbox, y_start)
+                if points:
+                    error = plane.lateral_error(points, w, h, cfg.BIRDSEYE_HALF_WIDTH)
         else:
             # 完全沒偵測到白色區域：回報 error=0 並將 confidence=0
             cx, cy = w // 2, 0
@@ -81,39 +266,50 @@ class Vision:
         # 在 ROI 上畫出中心線（綠）與質心點（紅），並顯示 error/conf
         debug = roi.copy()
 
-        # 原本程式寫法：(... >= 0 or True) 永遠為 True
-        # 這裡保留不改動，仍然每次都畫 debug（功能保持不變）
-        if cv2.getWindowProperty("Debug", cv2.WND_PROP_VISIBLE) >= 0 or True:
-            # 畫 ROI 中心線（綠色）
-            cv2.line(
+        # 每次都畫 debug（原本的 getWindowProperty 判斷結果恒為 True；
+        # 拿掉後控制迴圈不再呼叫任何 GUI 函式，headless / 遙測時也能用）
+
+        # 畫 ROI 中心線（綠色）
+        cv2.line(
+            debug,
+            (w // 2, 0),
+            (w // 2, debug.shape[0]),
+            (0, 255, 0),
+            1,
+        )
+
+        # 選中的連通區塊（黃框）
+        if bbox is not None:
+            x, y, bw, bh = bbox
+            cv2.rectangle(debug, (x, y), (x + bw, y + bh), (0, 255, 255), 1)
+
+        # 若有偵測到質心就畫出來並標示文字
+        if found:
+            cv2.circle(debug, (cx, cy), 5, (0, 0, 255), -1)
+            cv2.putText(
                 debug,
-                (w // 2, 0),
-                (w // 2, debug.shape[0]),
-                (0, 255, 0),
+                f"Err: {error:.2f}",
+                (10, 20),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (0, 0, 255),
+                1,
+            )
+            cv2.putText(
+                debug,
+                f"Conf: {confidence:.2f}",
+                (10, 40),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (0, 0, 255),
                 1,
             )
 
-            # 若有偵測到質心就畫出來並標示文字
-            if M["m00"] > 0:
-                cv2.circle(debug, (cx, cy), 5, (0, 0, 255), -1)
-                cv2.putText(
-                    debug,
-                    f"Err: {error:.2f}",
-                    (10, 20),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.5,
-                    (0, 0, 255),
-                    1,
-                )
-                cv2.putText(
-                    debug,
-                    f"Conf: {confidence:.2f}",
-                    (10, 40),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.5,
-                    (0, 0, 255),
-                    1,
-                )
+        if thumb is not None:
+            self._thumb = thumb
+            self._result = (error, confidence, mask, debug)
+            self._result_version = getattr(cfg, "version", None)
+            self._reuse_age = 0
 
         return error, confidence, mask, debug
 
@@ -122,6 +318,7 @@ def _run_vision_test():
     """
     測試模式：用 USB Camera + Vision
     - 用於調整 config.py 的 THRESH_VAL / ROI 相關參數
+      （也可直接改 CONFIG_FILE 或送 UDP，不用重開程式）
     - 按 q 離開
     """
     from .camera_usb import Camera
@@ -131,9 +328,12 @@ def _run_vision_test():
 
     cam = Camera()
     vision = Vision()
+    CONFIG.start_watcher(CONFIG.CONFIG_FILE, CONFIG.CONFIG_PORT)
 
     try:
         while True:
+            CONFIG.apply_pending()
+
             ret, frame = cam.read()
             if not ret:
                 break
@@ -153,6 +353,7 @@ def _run_vision_test():
         pass
 
     finally:
+        CONFIG.stop_watcher()
         cam.close()
         cv2.destroyAllWindows()
         print("\nDone.")
@@ -0,0 +1,173 @@
+# src/watchdog.py
+import threading
+import time
+from collections import deque
+
+from smbus2 import SMBus
+
+
+class MotorWatchdog:
+    """
+    馬達安全看門狗（獨立執行緒 + 自己的 I2C handle）
+    - 控制迴圈每個 tick 輸出後呼叫 pet()
+    - 超過 timeout 沒被 pet：寫 ALL_LED_OFF_H = 0x10（一次 I2C 寫入，16 通道 full-off，
+      優先於 full-on / PWM），ENA / ENB 與方向腳全關，車子滑行停下
+    - 停頓持續期間每次輪詢都再寫一次（主執行緒卡住的 I2C 寫入之後才完成時，會把通道又打開）
+    - 主迴圈恢復後、送出輸出前以 consume_trip() 得知輸出被切斷過，重設 slew / PD 狀態再繼續；
+      停頓長度以下一次 pet() 量到的間隔記錄（含 cam.read / Vision / I2C 的停頓）
+    不依賴主迴圈（cam.read() 卡住、I2C 交易卡住都能切斷輸出）；
+    限制：Python 執行緒需要 GIL，若主執行緒在 GC 等持有 GIL 的地方停住，
+    要等 GIL 釋放後才會切斷（停頓長度仍會記錄）；bus 本身卡死（SDA 被拉低）時寫入也會失敗
+    """
+
+    ALL_LED_OFF_H = 0xFD
+    FULL_OFF_BIT = 0x10
+
+    # 保留最近幾次停頓長度
+    HISTORY = 100
+
+    def __init__(self, bus_num: int, address: int = 0x40, timeout: float = 0.25, bus=None):
+        """
+        :param bus_num: I2C bus 編號（與 PCA9685 相同的 bus，另外開一個 handle）
+        :param timeout: 多久沒 pet 就切斷輸出（秒）
+        :param bus: 已開啟的 SMBus 相容物件（測試可傳 FakeSMBus）；None 則開啟 bus_num
+        """
+        self.address = address
+        self.timeout = timeout
+        self.bus = bus if bus is not None else SMBus(bus_num)
+
+        self._lock = threading.Lock()
+        # _last_pet：切斷期限的起點（consume_trip 會往後推）；_last_tick：上次 pet 的時間（量間隔用）
+        self._last_pet = time.monotonic()
+        self._last_tick = self._last_pet
+        self._tripped = False     # 輸出被切斷過，還沒被 consume_trip 處理
+        self._stalled = False     # 這次 pet 間隔中發生過觸發（pet 時記錄停頓長度）
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.trips = 0
+        self.cut_errors = 0
+        self.max_gap = 0.0
+        self.stalls = deque(maxlen=self.HISTORY)
+
+    # ===== 執行緒 =====
+    def start(self) -> None:
+        self._last_pet = time.monotonic()
+        self._last_tick = self._last_pet
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="motor-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self) -> None:
+        # 輪詢間隔：timeout 的 1/5（切斷最晚發生在 1.2 * timeout）
+        poll = self.timeout / 5
+        while not self._stop.wait(poll):
+            now = time.monotonic()
+            with self._lock:
+                gap = now - self._last_pet
+                if gap < self.timeout:
+                    continue
+                first = not self._tripped
+                self._tripped = True
+                self._stalled = True
+
+            # I2C 寫入放在鎖外：pet() 不會被卡住的 bus 拖住
+            self._cut()
+            if first:
+                self.trips += 1
+                print(f"[Watchdog] No tick for {gap * 1000:.0f} ms - motor outputs cut")
+
+    def _cut(self) -> None:
+        """最快的全停路徑：一次寫入 ALL_LED_OFF_H 的 full-off 位元"""
+        try:
+            self.bus.write_byte_data(self.address, self.ALL_LED_OFF_H, self.FULL_OFF_BIT)
+        except OSError as e:
+            self.cut_errors += 1
+            print(f"[Watchdog] Cut failed: {e}")
+
+    # ===== 主迴圈介面 =====
+    def pet(self, now: float = None) -> None:
+        """每個 tick 輸出後呼叫；間隔中觸發過時，把整段間隔記成一次停頓"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            gap = now - self._last_tick
+            stalled = self._stalled
+            self._stalled = False
+            self._last_tick = now
+            self._last_pet = now
+
+        if gap > self.max_gap:
+            self.max_gap = gap
+        if stalled:
+            self.stalls.append(gap)
+
+    def consume_trip(self, now: float = None):
+        """
+        每個 tick 送出輸出前呼叫（讀影像 / Vision 之後：停頓大多發生在那裡）
+        :return: 上次觸發後、到目前為止的停頓長度（秒）；沒有觸發過則回傳 None
+        """
+        if not self._tripped:
+            return None
+
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._tripped = False
+            stall = now - self._last_tick
+            # 這個 tick 的重設 / 輸出期間不要再觸發
+            self._last_pet = now
+        return stall
+
+    def summary(self) -> str:
+        worst = max(self.stalls, default=0.0)
+        return (
+            f"trips={self.trips} cut_err={self.cut_errors} "
+            f"max_gap={self.max_gap * 1000:.0f}ms worst_stall={worst * 1000:.0f}ms"
+        )
+
+    def close(self) -> None:
+        self.stop()
+        self.bus.close()
+
+
+def _run_watchdog_test():
+    """
+    測試模式（不需硬體）：FakePCA9685 上模擬主迴圈停住 0.5 秒
+    """
+    from .fake_smbus import FakeSMBus
+    from .pca9685_smbus import PCA9685
+
+    bus_num = 99
+    device = FakeSMBus.attach(bus_num)
+    pca = PCA9685(bus_num, bus=FakeSMBus(bus_num))
+    dog = MotorWatchdog(bus_num, timeout=0.1, bus=FakeSMBus(bus_num))
+    dog.start()
+
+    try:
+        pca.duty(0, 0.6)
+        for _ in range(10):
+            dog.pet()
+            time.sleep(0.02)
+        print(f"Running: ch0 duty = {device.duty(0):.2f}")
+
+        time.sleep(0.5)
+        print(f"Stalled: ch0 duty = {device.duty(0):.2f}")
+
+        stall = dog.consume_trip()
+        print(f"Resumed after {stall * 1000:.0f} ms stall")
+        pca.duty(0, 0.6)
+        dog.pet()
+        print(f"Resumed: ch0 duty = {device.duty(0):.2f}")
+    finally:
+        dog.close()
+        print(f"[Watchdog] {dog.summary()}")
+
+
+if __name__ == "__main__":
+    # 測試指令：python3 -m src.watchdog
+    _run_watchdog_test()